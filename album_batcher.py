@@ -0,0 +1,52 @@
+import asyncio
+import time
+
+
+class AlbumBatcher:
+    """Collects photos that share a Telegram `media_group_id`.
+
+    Telegram delivers each photo of an album as its own update. The first one
+    starts a timer; the group is handed to `handle_album(items)` once no new
+    photo has arrived for `window` seconds, after `max_wait` seconds, or when
+    `max_items` photos are collected (Telegram albums hold at most 10).
+    """
+
+    def __init__(self, handle_album, window=1.0, max_wait=5.0, max_items=10):
+        self.handle_album = handle_album
+        self.window = window
+        self.max_wait = max_wait
+        self.max_items = max_items
+        self._groups = {}  # media_group_id -> (items, first arrival, last arrival, set once full)
+        self._tasks = set()
+
+    def add(self, media_group_id, item):
+        now = time.monotonic()
+        group = self._groups.get(media_group_id)
+        if group is None:
+            self._groups[media_group_id] = ([item], now, now, asyncio.Event())
+            task = asyncio.create_task(self._flush_later(media_group_id))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+            return
+        items, first, _, full = group
+        items.append(item)
+        self._groups[media_group_id] = (items, first, now, full)
+        if len(items) >= self.max_items:
+            full.set()  # wake _flush_later now rather than at the next deadline
+
+    async def _flush_later(self, media_group_id):
+        while True:
+            items, first, last, full = self._groups[media_group_id]
+            now = time.monotonic()
+            deadline = min(last + self.window, first + self.max_wait)
+            if now >= deadline or len(items) >= self.max_items:
+                break
+            try:
+                await asyncio.wait_for(full.wait(), deadline - now)
+            except asyncio.TimeoutError:
+                pass
+        items, _, _, _ = self._groups.pop(media_group_id)
+        try:
+            await self.handle_album(items)
+        except Exception as e:
+            print(f"Error handling album {media_group_id}: {e}")
@@ -0,0 +1,64 @@
+"""Cold-start cost of the Vercel entry point: `import main` in a fresh interpreter.
+
+Each run starts a new Python process with placeholder credentials, so it
+measures import and initialization work only (no Telegram or Google traffic
+should happen at import). Pass --importtime to list the slowest imports.
+
+    python benchmarks/bench_cold_start.py --runs 10
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+ENV = {
+    "TELEGRAM_TOKEN": "123456:benchmark",
+    "GEMINI_API_KEY": "benchmark",
+    "GOOGLE_SHEET_ID": "benchmark",
+    "GOOGLE_DRIVE_FOLDER_ID": "benchmark",
+    "SHEET_SPOOL_PATH": os.path.join("/tmp", "bench_sheet_spool.jsonl"),
+    "IMAGE_CACHE_PATH": ":memory:",
+    "HISTORY_DB_PATH": ":memory:",
+}
+
+
+def run_once(extra_args=()):
+    env = dict(os.environ, **ENV)
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, *extra_args, "-c", "import main"], cwd=ROOT, env=env,
+                            capture_output=True, text=True)
+    elapsed = time.perf_counter() - start
+    if result.returncode != 0:
+        raise SystemExit(f"import main failed:\n{result.stderr}")
+    return elapsed, result.stderr
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--importtime", action="store_true", help="show the 15 slowest imports")
+    args = parser.parse_args()
+
+    samples = [run_once()[0] for _ in range(args.runs)]
+    print(f"import main: mean {statistics.mean(samples) * 1000:.0f} ms, "
+          f"min {min(samples) * 1000:.0f} ms over {args.runs} runs")
+
+    if args.importtime:
+        _, stderr = run_once(("-X", "importtime"))
+        rows = []
+        # Lines look like "import time:   self_us | cumulative_us | module"
+        for line in stderr.splitlines():
+            if not line.startswith("import time:") or "cumulative" in line:
+                continue
+            _, cumulative, name = line.split("|")
+            rows.append((int(cumulative), name.rstrip()))
+        for cumulative, name in sorted(rows, reverse=True)[:15]:
+            print(f"{cumulative / 1000:9.1f} ms  {name}")
+
+
+if __name__ == "__main__":
+    main()
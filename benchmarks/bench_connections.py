@@ -0,0 +1,118 @@
+"""Per-message latency of a fresh httpx client vs the shared ClientRegistry.
+
+Runs against a local stand-in for the Telegram Bot API by default; pass
+--base-url https://api.telegram.org/bot<token>/ to include real TLS handshakes.
+
+    python benchmarks/bench_connections.py --messages 200
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+
+class FakeTelegramHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        body = json.dumps({"ok": True, "result": {"message_id": 1}}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def start_fake_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeTelegramHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/botTOKEN/"
+
+
+def summarize(label, samples):
+    samples = sorted(samples)
+    p50 = samples[len(samples) // 2] * 1000
+    p99 = samples[int(len(samples) * 0.99) - 1] * 1000
+    print(f"{label:<28} mean {statistics.mean(samples) * 1000:7.2f} ms   p50 {p50:7.2f} ms   p99 {p99:7.2f} ms")
+
+
+async def per_message_client(base_url, messages):
+    samples = []
+    for i in range(messages):
+        start = time.perf_counter()
+        async with httpx.AsyncClient(base_url=base_url) as client:
+            await client.post("sendMessage", json={"chat_id": 1, "text": f"message {i}"})
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+async def shared_client(base_url, messages):
+    from clients import ClientRegistry
+    registry = ClientRegistry(None, "TOKEN")
+    registry._telegram = httpx.AsyncClient(base_url=base_url, limits=registry.limits, timeout=registry.timeout)
+    samples = []
+    for i in range(messages):
+        start = time.perf_counter()
+        await registry.telegram.post("sendMessage", json={"chat_id": 1, "text": f"message {i}"})
+        samples.append(time.perf_counter() - start)
+    await registry.aclose()
+    return samples
+
+
+def gemini_model_setup(iterations):
+    # Cost of configure + GenerativeModel per message vs a cached model (no network)
+    import google.generativeai as genai
+    from clients import ClientRegistry
+    fresh = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        genai.configure(api_key="benchmark")
+        genai.GenerativeModel("models/gemini-2.5-flash")
+        fresh.append(time.perf_counter() - start)
+    registry = ClientRegistry("benchmark", "TOKEN")
+    cached = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        registry.gemini_model()
+        cached.append(time.perf_counter() - start)
+    return fresh, cached
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=200)
+    parser.add_argument("--base-url", help="Telegram-compatible base URL ending in /bot<token>/")
+    args = parser.parse_args()
+
+    server = None
+    base_url = args.base_url
+    if base_url is None:
+        server, base_url = start_fake_server()
+    summarize("new client per message", asyncio.run(per_message_client(base_url, args.messages)))
+    summarize("shared pooled client", asyncio.run(shared_client(base_url, args.messages)))
+    try:
+        fresh, cached = gemini_model_setup(args.messages)
+    except ImportError:
+        print("google-generativeai not installed; skipping Gemini model setup")
+    else:
+        summarize("Gemini model per message", fresh)
+        summarize("Gemini model from registry", cached)
+    if server is not None:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
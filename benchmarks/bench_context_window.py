@@ -0,0 +1,70 @@
+"""Prompt tokens per request: the full 10-turn history vs ContextWindow.
+
+Replays a synthetic conversation with long bot answers through HistoryStore
+and ContextWindow and compares the estimated prompt size of each request.
+Summaries come from an offline stand-in that keeps the user's questions, so
+the numbers show the window's effect on prompt size, not summary quality.
+Summarization requests are counted separately since they cost tokens too.
+
+    python benchmarks/bench_context_window.py --turns 40 --budget 1500 --reply-chars 1600
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from context_window import ContextWindow, estimate_tokens
+from history_store import HistoryStore
+
+QUESTIONS = [
+    "I want to lose 5 kg in two months, where do I start?", "I'm vegetarian and allergic to peanuts.",
+    "What should I eat for breakfast?", "Is paneer good for weight loss?", "How much protein do I need a day?",
+    "Can you suggest a dinner under 500 kcal?", "Is rice at night a problem?", "What about snacks at work?",
+]
+
+
+async def offline_summary(summary, turns, max_words=150):
+    words = (summary + " " + " ".join(user_text for user_text, _ in turns)).split()
+    return " ".join(words[-max_words:])
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--turns", type=int, default=40)
+    parser.add_argument("--budget", type=int, default=1500)
+    parser.add_argument("--summary-tokens", type=int, default=250)
+    parser.add_argument("--reply-chars", type=int, default=1600)
+    args = parser.parse_args()
+
+    history = HistoryStore(max_turns=10)
+    summary_tokens = []
+
+    async def summarize(summary, turns, max_words=150):
+        summary_tokens.append(estimate_tokens(summary + "".join(user_text + reply for user_text, reply in turns)))
+        return await offline_summary(summary, turns, max_words)
+
+    window = ContextWindow(history, summarize, budget=args.budget, summary_tokens=args.summary_tokens)
+    full, windowed = [], []
+    for turn in range(args.turns):
+        question = QUESTIONS[turn % len(QUESTIONS)]
+        history_prompt = history.prompt(1)
+        full.append(estimate_tokens(history_prompt + f"User: {question}\nBot:" if history_prompt else question))
+        _, prompt = window.build(1, question)
+        windowed.append(estimate_tokens(prompt))
+        history.append(1, question, f"Answer {turn}: " + "x" * args.reply_chars)
+        window.summarize_later(1)
+        await asyncio.gather(*window._tasks)
+
+    spent = sum(windowed) + sum(summary_tokens)
+    print(f"{args.turns} requests, budget {args.budget} tokens, replies of {args.reply_chars} chars")
+    print(f"full history    mean {statistics.mean(full):7.0f}  max {max(full):6d}  total {sum(full):8d} tokens")
+    print(f"context window  mean {statistics.mean(windowed):7.0f}  max {max(windowed):6d}  total {sum(windowed):8d} tokens")
+    print(f"summarization   {len(summary_tokens)} requests, {sum(summary_tokens)} tokens")
+    print(f"prompt tokens saved: {1 - spent / sum(full):.1%} including summarization")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
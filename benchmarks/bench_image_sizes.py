@@ -0,0 +1,88 @@
+"""Analysis latency and estimate drift across image sizes on a fixture set.
+
+Every image in --fixtures is prepared at each --sizes target (0 = original
+bytes) and sent to Gemini. Calories are compared against labels.json in the
+fixture directory ({"file.jpg": kcal}) when present, otherwise against the
+estimate for the original image. Without GEMINI_API_KEY only the
+preprocessing cost and payload sizes are reported.
+
+    python benchmarks/bench_image_sizes.py --fixtures path/to/meals --sizes 0 1280 1024 768 512
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from image_prep import prepare_for_analysis
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp")
+
+
+def load_fixtures(directory):
+    fixtures = {}
+    for name in sorted(os.listdir(directory)):
+        if name.lower().endswith(IMAGE_EXTENSIONS):
+            with open(os.path.join(directory, name), "rb") as f:
+                fixtures[name] = f.read()
+    labels_path = os.path.join(directory, "labels.json")
+    labels = {}
+    if os.path.exists(labels_path):
+        with open(labels_path, encoding="utf-8") as f:
+            labels = json.load(f)
+    return fixtures, labels
+
+
+def calories_of(entry):
+    try:
+        return float(entry.calories)
+    except (TypeError, ValueError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--fixtures", required=True)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[0, 1280, 1024, 768, 512])
+    args = parser.parse_args()
+
+    fixtures, labels = load_fixtures(args.fixtures)
+    if not fixtures:
+        raise SystemExit(f"No images found in {args.fixtures}")
+    api_key = os.getenv("GEMINI_API_KEY")
+    if api_key:
+        from modules import ImageCalorieModule, gemini_model
+        model = gemini_model(api_key)
+
+    reference = dict(labels)
+    print(f"{'size':>6} {'avg bytes':>10} {'prep ms':>8} {'analysis s':>11} {'parsed':>7} {'mean abs kcal err':>18}")
+    for size in args.sizes:
+        sizes, prep_times, latencies, errors, parsed = [], [], [], [], 0
+        for name, original in fixtures.items():
+            start = time.perf_counter()
+            image_bytes = original if size == 0 else prepare_for_analysis(original, max_side=size)
+            prep_times.append(time.perf_counter() - start)
+            sizes.append(len(image_bytes))
+            if not api_key:
+                continue
+            start = time.perf_counter()
+            entry, _ = ImageCalorieModule.analyze_image(image_bytes, api_key, model=model)
+            latencies.append(time.perf_counter() - start)
+            calories = calories_of(entry)
+            if calories is None:
+                continue
+            parsed += 1
+            if name not in reference:
+                reference[name] = calories  # first size tried (the original by default) is the baseline
+            errors.append(abs(calories - float(reference[name])))
+        latency = f"{statistics.mean(latencies):11.2f}" if latencies else f"{'-':>11}"
+        error = f"{statistics.mean(errors):18.1f}" if errors else f"{'-':>18}"
+        print(f"{size or 'orig':>6} {statistics.mean(sizes):10.0f} {statistics.mean(prep_times) * 1000:8.1f} "
+              f"{latency} {parsed:>3}/{len(fixtures):<3} {error}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""Parse success rate and cost: regex scraping vs structured JSON decoding.
+
+--responses is a JSONL file of recorded Gemini replies, one {"text": ...} per
+line (free-text replies from before structured output and JSON replies from
+after can be mixed). Without it a small built-in sample is used. A reply
+counts as parsed when the food name and all four nutrients come out.
+
+    python benchmarks/bench_meal_parsing.py --responses recorded.jsonl --repeat 2000
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from modules import ImageCalorieModule, NUTRIENT_FIELDS
+
+SAMPLE = [
+    '{"food": "Masala dosa", "calories": 387, "proteins": 8, "carbs": 52.5, "fat": 16}',
+    '{"food": "Boiled eggs (2)", "calories": 155, "proteins": 12.6, "carbs": 1.1, "fat": 10.6}',
+    '{"food": "", "calories": 0, "proteins": 0, "carbs": 0, "fat": 0}',
+    "**Food:** Paneer tikka\n**Calories:** 320\n**Proteins:** 18\n**Carbs:** 9\n**Fat:** 24",
+    "**Food:** Banana\n**Calories:** 105 kcal\n**Proteins:** 1.3 g\n**Carbs:** 27 g\n**Fat:** 0.4 g",
+    "Food: Dal rice\nCalories: 450\nProteins: 14\nCarbs: 70\nFat: 10",
+    "*Food:* Poha\n*Calories:* 250\n*Proteins:* 5\n*Carbs:* 45\n*Fat:* 6",
+    "Sorry, I couldn't analyze that.",
+]
+
+
+def legacy_parse(text):
+    # What ImageCalorieModule.parse_response did before structured output
+    meal = {"food": ""}
+    match = re.search(r"\*\*Food:\*\*\s*(.*)", text)
+    if match:
+        meal["food"] = match.group(1)
+    for field in NUTRIENT_FIELDS:
+        match = re.search(rf"\*\*{field.capitalize()}:\*\*\s*(\d+)", text)
+        meal[field] = match.group(1) if match else ""
+    return meal
+
+
+def complete(meal):
+    return bool(meal["food"]) and all(meal[field] not in (None, "") for field in NUTRIENT_FIELDS)
+
+
+def load_responses(path):
+    if not path:
+        return SAMPLE
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line)["text"] for line in f if line.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--responses")
+    parser.add_argument("--repeat", type=int, default=2000)
+    args = parser.parse_args()
+
+    responses = load_responses(args.responses)
+    print(f"{len(responses)} responses")
+    for label, func in (("regex scraping", legacy_parse), ("structured decoding", ImageCalorieModule.parse_meal)):
+        parsed = sum(complete(func(text)) for text in responses)
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            for text in responses:
+                func(text)
+        elapsed = time.perf_counter() - start
+        per_reply = elapsed / (args.repeat * len(responses)) * 1e6
+        print(f"{label:<20} parsed {parsed}/{len(responses)} ({parsed / len(responses):.0%})  {per_reply:8.2f} us/reply")
+
+
+if __name__ == "__main__":
+    main()
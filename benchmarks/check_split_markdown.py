@@ -0,0 +1,34 @@
+"""Regression checks for streaming.split_markdown.
+
+    python benchmarks/check_split_markdown.py
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from streaming import FENCE, MAX_TELEGRAM_MSG_LENGTH, split_markdown
+
+CASES = {
+    "short": "hello",
+    "paragraphs": ("word " * 300 + "\n\n") * 10,
+    # A reopened fence followed by one unbreakable line used to loop forever
+    "fence + long line": "Intro\n\n```\n" + "a" * 5000 + "\n```",
+    "fence + several long lines": "```\n" + ("b" * 6000 + "\n") * 3 + "```",
+    "no separators": "c" * 20000,
+}
+
+
+def main():
+    for name, text in CASES.items():
+        parts = split_markdown(text)
+        assert len(parts) <= len(text) // 100 + 2, f"{name}: {len(parts)} parts"
+        assert all(len(part) <= MAX_TELEGRAM_MSG_LENGTH for part in parts), f"{name}: part over the limit"
+        assert all(part.count(FENCE) % 2 == 0 for part in parts), f"{name}: unbalanced fence"
+        stripped = "".join(parts).replace(FENCE, "").replace("\n", "").replace(" ", "")
+        assert stripped == text.replace(FENCE, "").replace("\n", "").replace(" ", ""), f"{name}: text lost"
+        print(f"ok  {name:<28} {len(parts)} parts")
+
+
+if __name__ == "__main__":
+    main()
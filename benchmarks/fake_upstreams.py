@@ -0,0 +1,367 @@
+"""Local stand-ins for every upstream the bot talks to, for offline load tests.
+
+One threaded HTTP server answers, by path prefix:
+
+    /bot<token>/<method>        Telegram Bot API (getMe, getFile, sendMessage, editMessageText, ...)
+    /file/bot<token>/<path>     Telegram file downloads (a generated JPEG per file)
+    /gemini/...                 Gemini generateContent / streamGenerateContent (REST JSON shape)
+    /drive/..., /upload/drive/  Drive v3 file uploads, simple and resumable (in chunks)
+    /sheets/...                 Sheets v4 values get and append
+
+Every upstream has an Injection with a fixed latency, random jitter and an
+error rate, so slow or failing upstreams can be simulated independently.
+The server records when each chat got its first reply, which is what
+load_test.py measures latency against, as well as completed Drive uploads
+and requests no stand-in recognized, so a harness can tell when the bot's
+calls never really reached an upstream.
+"""
+import base64
+import io
+import json
+import random
+import re
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+from urllib.parse import parse_qs, unquote, urlsplit
+
+UPSTREAMS = ("telegram", "gemini", "drive", "sheets")
+
+LOREM = (
+    "A balanced plate has protein, fibre and healthy fats. Aim for whole grains, plenty of vegetables "
+    "and enough water through the day. Portion size matters as much as food choice. "
+)
+
+
+class Injection:
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0, error_status=503):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+
+    def apply(self):
+        # Sleeps for the simulated latency; returns the status to fail with, or None
+        delay = self.latency + random.uniform(0, self.jitter)
+        if delay > 0:
+            time.sleep(delay)
+        if self.error_rate and random.random() < self.error_rate:
+            return self.error_status
+        return None
+
+
+def make_image():
+    # Distinct noise per file so image caches don't turn the run into cache hits
+    try:
+        from PIL import Image
+    except ImportError:
+        return b"\xff\xd8\xff\xe0" + random.randbytes(2048) + b"\xff\xd9"
+    out = io.BytesIO()
+    Image.effect_noise((640, 480), 64).convert("RGB").save(out, format="JPEG", quality=85)
+    return out.getvalue()
+
+
+class FakeUpstreams:
+    def __init__(self, injections=None, reply_chars=400):
+        self.injections = {name: Injection() for name in UPSTREAMS}
+        self.injections.update(injections or {})
+        self.reply_chars = reply_chars
+        self.calls = Counter()
+        self.errors = Counter()
+        self.first_reply = {}  # chat_id -> perf_counter() of its first delivered message
+        self.sheet_rows = {}  # tab -> rows as appended (row ID in the first column)
+        self.uploads = 0  # Drive files fully received
+        self.unrouted = Counter()  # "METHOD path" of requests no stand-in handled
+        self.url = None
+        self._images = {}
+        self._models = {}
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self._server = None
+
+    def start(self):
+        handler = type("Handler", (UpstreamHandler,), {"upstreams": self})
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name="fake-upstreams", daemon=True).start()
+        self.url = f"http://127.0.0.1:{self._server.server_address[1]}"
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+
+    def new_id(self):
+        with self._lock:
+            self._next_id += 1
+            return self._next_id
+
+    def image(self, file_id):
+        with self._lock:
+            if file_id not in self._images:
+                self._images[file_id] = make_image()
+            return self._images[file_id]
+
+    def record_reply(self, chat_id):
+        now = time.perf_counter()
+        with self._lock:
+            self.first_reply.setdefault(str(chat_id), now)
+
+    def reply_text(self):
+        return (LOREM * (self.reply_chars // len(LOREM) + 1))[:self.reply_chars]
+
+    # Clients for the upstreams whose SDKs can't simply be given a base URL
+
+    def gemini_model(self, name="models/gemini-2.5-flash", tools=None, system_instruction=None):
+        # Same signature as ClientRegistry.gemini_model; tools and the system instruction are ignored
+        if name not in self._models:
+            self._models[name] = FakeGeminiModel(f"{self.url}/gemini/v1beta/{name}")
+        return self._models[name]
+
+    async def aclose(self):
+        for model in self._models.values():
+            await model.aclose()
+
+    def google_service(self, name, version):
+        # Same signature as GoogleServices._build
+        from googleapiclient.discovery import build
+        return build(name, version, http=plain_http(), static_discovery=True, cache_discovery=False,
+                     client_options={"api_endpoint": f"{self.url}/{name}/"})
+
+
+def plain_http():
+    """httplib2.Http that talks plain HTTP to the fake server. Discovery keeps
+    the https scheme of the media upload URL (only the host comes from
+    api_endpoint), which the fake server can't answer."""
+    import httplib2
+
+    class PlainHttp(httplib2.Http):
+        def request(self, uri, *args, **kwargs):
+            if uri.startswith("https://127.0.0.1:"):
+                uri = "http://" + uri[len("https://"):]
+            return super().request(uri, *args, **kwargs)
+
+    http = PlainHttp(timeout=60)
+    # Resumable uploads answer 308 for "send the next chunk", not as a redirect
+    http.redirect_codes = http.redirect_codes - {308}
+    return http
+
+
+class UpstreamHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    upstreams = None
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        self.route()
+
+    def do_POST(self):
+        self.route()
+
+    def do_PUT(self):
+        self.route()
+
+    def route(self):
+        length = int(self.headers.get("Content-Length", 0))
+        self.body = self.rfile.read(length) if length else b""
+        path = urlsplit(self.path).path
+        if path.startswith("/bot") or path.startswith("/file/bot"):
+            name, handle = "telegram", self.telegram
+        elif path.startswith("/gemini/"):
+            name, handle = "gemini", self.gemini
+        elif path.startswith("/drive/") or path.startswith("/upload/drive/"):
+            name, handle = "drive", self.drive
+        elif path.startswith("/sheets/"):
+            name, handle = "sheets", self.sheets
+        else:
+            self.upstreams.unrouted[f"{self.command} {path}"] += 1
+            return self.send_json(404, {"error": "unknown upstream"})
+        self.upstreams.calls[name] += 1
+        status = self.upstreams.injections[name].apply()
+        if status is not None:
+            self.upstreams.errors[name] += 1
+            return self.send_error_status(name, status)
+        handle(path)
+
+    def send_body(self, status, body, content_type="application/json", headers=None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_json(self, status, data, headers=None):
+        self.send_body(status, json.dumps(data).encode(), headers=headers)
+
+    def send_error_status(self, name, status):
+        if name == "telegram":
+            data = {"ok": False, "error_code": status, "description": "Injected error"}
+            if status == 429:
+                data["parameters"] = {"retry_after": 1}
+            return self.send_json(status, data)
+        self.send_json(status, {"error": {"code": status, "message": "Injected error"}})
+
+    def params(self):
+        content_type = self.headers.get("Content-Type", "")
+        if "json" in content_type:
+            return json.loads(self.body or b"{}")
+        if "x-www-form-urlencoded" in content_type:
+            return {key: values[0] for key, values in parse_qs(self.body.decode()).items()}
+        return {}
+
+    # Telegram
+
+    def telegram(self, path):
+        if path.startswith("/file/bot"):
+            file_id = path.rsplit("/", 1)[-1].rsplit(".", 1)[0]
+            return self.send_body(200, self.upstreams.image(file_id), content_type="image/jpeg")
+        method = path.rsplit("/", 1)[-1]
+        params = self.params()
+        if method == "getMe":
+            result = {"id": 1, "is_bot": True, "first_name": "Bench", "username": "bench_bot"}
+        elif method == "getFile":
+            file_id = params.get("file_id", "file")
+            result = {"file_id": file_id, "file_unique_id": file_id, "file_size": len(self.upstreams.image(file_id)),
+                      "file_path": f"photos/{file_id}.jpg"}
+        elif method in ("sendMessage", "editMessageText"):
+            chat_id = params.get("chat_id")
+            self.upstreams.record_reply(chat_id)
+            result = {"message_id": self.upstreams.new_id(), "date": int(time.time()),
+                      "chat": {"id": int(chat_id), "type": "private"}, "text": params.get("text", "")}
+        else:
+            result = True
+        self.send_json(200, {"ok": True, "result": result})
+
+    # Gemini
+
+    def gemini(self, path):
+        request = json.loads(self.body or b"{}")
+        config = request.get("generation_config") or {}
+        schema = config.get("response_schema")
+        if schema and "items" in schema.get("properties", {}):
+            images = sum("inline_data" in part for content in request.get("contents", []) for part in content["parts"])
+            text = json.dumps({"items": [self.meal() for _ in range(images)]})
+        elif schema:
+            text = json.dumps(self.meal())
+        else:
+            text = self.upstreams.reply_text()
+        if not path.endswith(":streamGenerateContent"):
+            return self.send_json(200, {"candidates": [{"content": {"role": "model", "parts": [{"text": text}]}}]})
+        step = max(1, len(text) // 5)
+        events = [
+            "data: " + json.dumps({"candidates": [{"content": {"role": "model", "parts": [{"text": text[i:i + step]}]}}]}) + "\n\n"
+            for i in range(0, len(text), step)
+        ]
+        self.send_body(200, "".join(events).encode(), content_type="text/event-stream")
+
+    @staticmethod
+    def meal():
+        return {"food": random.choice(["Masala dosa", "Dal rice", "Paneer tikka", "Poha", "Chicken salad"]),
+                "calories": random.randint(150, 700), "proteins": random.randint(3, 40),
+                "carbs": random.randint(5, 90), "fat": random.randint(1, 35)}
+
+    # Drive
+
+    def drive(self, path):
+        query = parse_qs(urlsplit(self.path).query)
+        if query.get("uploadType") == ["resumable"]:
+            location = f"{self.upstreams.url}/drive/resumable/{self.upstreams.new_id()}"
+            return self.send_json(200, {}, headers={"Location": location})
+        if path.startswith("/drive/resumable/"):
+            # Chunks arrive as "Content-Range: bytes first-last/total"; 308 asks for the next one
+            match = re.match(r"bytes (\d+)-(\d+)/(\d+)", self.headers.get("Content-Range", ""))
+            if match and int(match.group(2)) + 1 < int(match.group(3)):
+                return self.send_body(308, b"", content_type="text/plain", headers={"Range": f"bytes=0-{match.group(2)}"})
+        elif not path.startswith("/upload/drive/"):
+            return self.send_json(404, {"error": {"code": 404, "message": f"Unsupported path {path}"}})
+        with self.upstreams._lock:
+            self.upstreams.uploads += 1
+        self.send_json(200, {"id": f"fake-file-{self.upstreams.new_id()}"})
+
+    # Sheets
+
+    def sheets(self, path):
+        path = unquote(path)
+        match = re.search(r"/values/([^!]+)!([A-Z]+)\d*(?::([A-Z]+))?(:append)?$", path)
+        if match is None:
+            return self.send_json(404, {"error": {"code": 404, "message": f"Unsupported path {path}"}})
+        tab, first_col, last_col, append = match.groups()
+        rows = self.upstreams.sheet_rows.setdefault(tab, [])
+        if append:
+            new_rows = json.loads(self.body or b"{}").get("values", [])
+            rows.extend(new_rows)
+            return self.send_json(200, {"updates": {"updatedRows": len(new_rows)}})
+        # Rows are stored from column B; slice to the requested columns
+        start = ord(first_col) - ord("B")
+        end = ord(last_col) - ord("B") + 1 if last_col else None
+        self.send_json(200, {"values": [row[start:end] for row in rows]})
+
+
+class FakeGeminiModel:
+    """Duck-typed stand-in for genai.GenerativeModel that posts to the fake
+    Gemini endpoint over HTTP. HTTP errors surface as httpx.HTTPStatusError,
+    which rate_limit.status_of understands, so retries behave as in production."""
+
+    def __init__(self, url):
+        self.url = url
+        self._client = None
+
+    def _http(self):
+        import httpx
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(timeout=60)
+        return self._client
+
+    @staticmethod
+    def _encode(contents):
+        encoded = []
+        for content in contents:
+            parts = []
+            for part in content["parts"]:
+                if "inline_data" in part:
+                    data = base64.b64encode(part["inline_data"]["data"]).decode()
+                    part = {"inline_data": {"mime_type": part["inline_data"]["mime_type"], "data": data}}
+                parts.append(part)
+            encoded.append({"role": content["role"], "parts": parts})
+        return encoded
+
+    @staticmethod
+    def _response(data):
+        candidates = [
+            SimpleNamespace(content=SimpleNamespace(parts=[SimpleNamespace(text=part.get("text", "")) for part in c["content"]["parts"]]))
+            for c in data.get("candidates", [])
+        ]
+        text = candidates[0].content.parts[0].text if candidates else ""
+        return SimpleNamespace(candidates=candidates, text=text)
+
+    async def generate_content_async(self, contents, generation_config=None, stream=False, **kwargs):
+        body = {"contents": self._encode(contents), "generation_config": generation_config}
+        client = self._http()
+        if not stream:
+            resp = await client.post(f"{self.url}:generateContent", json=body)
+            resp.raise_for_status()
+            return self._response(resp.json())
+        resp = await client.send(client.build_request("POST", f"{self.url}:streamGenerateContent", json=body), stream=True)
+        if resp.is_error:
+            await resp.aread()
+            resp.raise_for_status()
+
+        async def chunks():
+            try:
+                async for line in resp.aiter_lines():
+                    if line.startswith("data: "):
+                        yield self._response(json.loads(line[len("data: "):]))
+            finally:
+                await resp.aclose()
+        return chunks()
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
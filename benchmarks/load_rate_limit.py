@@ -0,0 +1,116 @@
+"""Simulated burst load against a local fake Bot API, with and without UpstreamGuard.
+
+The fake server enforces a global requests-per-second quota and answers 429
+with retry_after when it is exceeded, like Telegram does. It can also be put
+in an outage mode (503 for everything) to show the circuit breaker failing fast.
+
+    python benchmarks/load_rate_limit.py --messages 300 --chats 20 --server-rps 50
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from rate_limit import CircuitBreaker, CircuitOpen, RateLimitedTelegram, UpstreamGuard
+
+
+class FakeBotAPI(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    quota = 50
+    outage = False
+    recent = deque()
+    lock = threading.Lock()
+    counts = {"ok": 0, "429": 0, "503": 0}
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        now = time.monotonic()
+        with self.lock:
+            while self.recent and now - self.recent[0] > 1.0:
+                self.recent.popleft()
+            if self.outage:
+                status, body = 503, {"ok": False, "description": "Service Unavailable"}
+            elif len(self.recent) >= self.quota:
+                status, body = 429, {"ok": False, "error_code": 429, "parameters": {"retry_after": 1}}
+            else:
+                self.recent.append(now)
+                status, body = 200, {"ok": True, "result": {"message_id": 1}}
+            self.counts["ok" if status == 200 else str(status)] += 1
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+async def burst(client, messages, chats):
+    async def send(i):
+        try:
+            resp = await client.post("sendMessage", json={"chat_id": i % chats, "text": f"message {i}"})
+            return resp.status_code
+        except CircuitOpen:
+            return "circuit open"
+    start = time.perf_counter()
+    results = await asyncio.gather(*(send(i) for i in range(messages)))
+    elapsed = time.perf_counter() - start
+    summary = {}
+    for result in results:
+        summary[result] = summary.get(result, 0) + 1
+    return elapsed, summary
+
+
+def report(label, elapsed, summary):
+    server = dict(FakeBotAPI.counts)
+    for key in FakeBotAPI.counts:
+        FakeBotAPI.counts[key] = 0
+    print(f"{label:<22} {elapsed:6.2f} s   client saw {summary}   server answered {server}")
+
+
+async def run(args, base_url):
+    async with httpx.AsyncClient(base_url=base_url, limits=httpx.Limits(max_connections=50)) as raw:
+        report("unguarded", *await burst(raw, args.messages, args.chats))
+        await asyncio.sleep(1.1)
+
+        guard = UpstreamGuard("telegram", rate=args.server_rps * 0.9, burst=args.server_rps * 0.9,
+                              per_chat_rate=args.chat_rps, per_chat_burst=3, max_retries=5, base_delay=0.1)
+        guarded = RateLimitedTelegram(raw, guard)
+        report("guarded", *await burst(guarded, args.messages, args.chats))
+
+        FakeBotAPI.outage = True
+        breaker = CircuitBreaker(failure_threshold=5, reset_timeout=30)
+        guard = UpstreamGuard("telegram", rate=1000, burst=1000, max_retries=2, base_delay=0.05, breaker=breaker)
+        report("guarded, outage", *await burst(RateLimitedTelegram(raw, guard), args.messages, args.chats))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=300)
+    parser.add_argument("--chats", type=int, default=20)
+    parser.add_argument("--server-rps", type=int, default=50)
+    parser.add_argument("--chat-rps", type=float, default=10)
+    args = parser.parse_args()
+
+    FakeBotAPI.quota = args.server_rps
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeBotAPI)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        asyncio.run(run(args, f"http://127.0.0.1:{server.server_address[1]}/botTOKEN/"))
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,270 @@
+"""Offline load test: the FastAPI app against local upstream stand-ins.
+
+Boots main.app in-process with the Telegram Bot API pointed at
+benchmarks/fake_upstreams.py (TELEGRAM_API_URL) and the Gemini, Drive and
+Sheets clients swapped for ones that talk to the same local server, so no
+credentials or network access are needed. Updates are posted to /webhook at
+--rate per second (open loop) and latency is measured from delivery of a
+request's first update to the first message Telegram receives for its chat.
+Albums include the ALBUM_WINDOW_SECONDS wait and streamed replies count from
+their first chunk.
+
+Synthetic text/photo/album traffic is generated by default; --replay takes a
+JSONL file of recorded Telegram updates instead (chat IDs are remapped so
+each message, or album, is tracked separately). Bot settings come from the
+usual environment variables, e.g. WEBHOOK_QUEUE=memory or GEMINI_RPS.
+
+The run exits with status 1 when work silently went missing: requests left
+unanswered, requests no fake upstream recognized, or fewer Drive uploads or
+meal rows than photos sent (checked only for upstreams without injected
+errors), so broken wiring can't pass for a fast upstream.
+
+    python benchmarks/load_test.py --updates 500 --rate 50 --mix text=0.7,photo=0.2,album=0.1
+    python benchmarks/load_test.py --replay updates.jsonl --rate 20 --latency gemini=0.8,telegram=0.05 --errors gemini=0.05
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import Counter, defaultdict
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, os.path.dirname(__file__))
+
+from fake_upstreams import UPSTREAMS, FakeUpstreams, Injection
+
+TEXTS = [
+    "hi", "what are your plans", "do you have any offers right now?", "calories in a banana",
+    "how much protein is in 2 boiled eggs and a bowl of dal", "is paneer good for weight loss",
+    "Can you suggest a keto diet for a 30 year old vegetarian who works night shifts?",
+    "what should I eat before a workout", "how many calories have I had today",
+]
+
+
+def parse_pairs(text, cast=float):
+    # "gemini=0.8,telegram=0.05" -> {"gemini": 0.8, "telegram": 0.05}
+    pairs = {}
+    for item in filter(None, (text or "").split(",")):
+        key, value = item.split("=")
+        pairs[key.strip()] = cast(value)
+    return pairs
+
+
+def message(chat_id, **fields):
+    return dict({
+        "message_id": random.randint(1, 10 ** 9), "date": int(time.time()),
+        "chat": {"id": chat_id, "type": "private"},
+        "from": {"id": chat_id, "is_bot": False, "first_name": f"User{chat_id}"}
+    }, **fields)
+
+
+def photo_sizes(file_id):
+    return [{"file_id": f"{file_id}_{i}", "file_unique_id": f"{file_id}_{i}", "width": width, "height": width * 3 // 4, "file_size": width * 100}
+            for i, width in enumerate((90, 320, 800, 1280))]
+
+
+def synthetic_requests(count, mix, album_size):
+    # Returns [(kind, chat_id, [message, ...])]; each request gets its own chat
+    kinds, weights = zip(*mix.items())
+    requests = []
+    for chat_id in range(1, count + 1):
+        kind = random.choices(kinds, weights)[0]
+        if kind == "text":
+            requests.append((kind, chat_id, [message(chat_id, text=random.choice(TEXTS))]))
+        elif kind == "photo":
+            requests.append((kind, chat_id, [message(chat_id, photo=photo_sizes(f"p{chat_id}"))]))
+        else:
+            requests.append((kind, chat_id, [message(chat_id, photo=photo_sizes(f"a{chat_id}_{i}"), media_group_id=f"g{chat_id}")
+                                             for i in range(album_size)]))
+    return requests
+
+
+def replayed_requests(path):
+    # Remaps chats so every message, or every album, is a separately timed request
+    requests, albums = [], {}
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            msg = json.loads(line).get("message")
+            if not msg:
+                continue
+            group = msg.get("media_group_id")
+            if group in albums:
+                kind, chat_id, messages = requests[albums[group]]
+                messages.append(msg)
+            else:
+                chat_id = len(requests) + 1
+                kind = "album" if group else "photo" if msg.get("photo") else "text"
+                requests.append((kind, chat_id, [msg]))
+                if group:
+                    albums[group] = len(requests) - 1
+            msg["chat"] = {"id": chat_id, "type": "private"}
+            msg.setdefault("from", {"id": chat_id, "is_bot": False, "first_name": f"User{chat_id}"})
+            msg["date"] = int(time.time())
+    return requests
+
+
+def percentile(values, q):
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q / 100 * (len(values) - 1))))]
+
+
+def rss_mb():
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def configure_environment(fake, workdir):
+    # Forced so a local .env can't point the run at real upstreams
+    os.environ.update({
+        "TELEGRAM_TOKEN": "123456:bench", "TELEGRAM_API_URL": fake.url, "GEMINI_API_KEY": "bench",
+        "GOOGLE_SHEET_ID": "bench-sheet", "GOOGLE_DRIVE_FOLDER_ID": "bench-folder", "GOOGLE_OAUTH_TOKEN_PICKLE": "",
+    })
+    for name, file_name in (("SHEET_SPOOL_PATH", "sheet_spool.jsonl"), ("IMAGE_CACHE_PATH", "image_cache.sqlite3"),
+                            ("HISTORY_DB_PATH", "chat_history.sqlite3"), ("NUTRITION_DB_PATH", "nutrition.sqlite3"),
+                            ("WEBHOOK_QUEUE_PATH", "update_queue.sqlite3")):
+        os.environ[name] = os.path.join(workdir, file_name)
+
+
+async def run(args, fake, requests):
+    import httpx
+    import main
+
+    main.clients.gemini_model = fake.gemini_model
+    main.google._build = fake.google_service
+
+    updates = []  # (send offset, chat_id, update)
+    update_id = 0
+    for _, chat_id, messages in requests:
+        for msg in messages:
+            update_id += 1
+            updates.append((len(updates) / args.rate, chat_id, {"update_id": update_id, "message": msg}))
+    kinds = {str(chat_id): kind for kind, chat_id, _ in requests}
+    sent_at = {}
+    webhook_times = []
+    statuses = Counter()
+
+    rss_before = rss_mb()
+    transport = httpx.ASGITransport(app=main.app)
+    async with main.app.router.lifespan_context(main.app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            start = time.perf_counter()
+
+            async def deliver(offset, chat_id, update):
+                await asyncio.sleep(max(0.0, start + offset - time.perf_counter()))
+                now = time.perf_counter()
+                sent_at.setdefault(str(chat_id), now)
+                try:
+                    resp = await client.post("/webhook", json=update)
+                    statuses[resp.status_code] += 1
+                except Exception as e:
+                    statuses[type(e).__name__] += 1
+                webhook_times.append(time.perf_counter() - now)
+
+            await asyncio.gather(*(deliver(*update) for update in updates))
+            sent_elapsed = time.perf_counter() - start
+            deadline = time.perf_counter() + args.timeout
+            while len(fake.first_reply) < len(requests) and time.perf_counter() < deadline:
+                await asyncio.sleep(0.05)
+            elapsed = max(fake.first_reply.values(), default=start) - start
+    rss_after = rss_mb()
+    await fake.aclose()
+
+    latencies = defaultdict(list)
+    for chat_id, replied in fake.first_reply.items():
+        if chat_id in sent_at:
+            latencies[kinds[chat_id]].append(replied - sent_at[chat_id])
+            latencies["all"].append(replied - sent_at[chat_id])
+
+    by_kind = Counter(kind for kind, _, _ in requests)
+    print(f"{len(updates)} updates in {len(requests)} requests ({', '.join(f'{n} {k}' for k, n in sorted(by_kind.items()))})")
+    print(f"sent at {len(updates) / sent_elapsed:.1f} updates/s (target {args.rate:g}); webhook status: "
+          + ", ".join(f"{status}={n}" for status, n in sorted(statuses.items(), key=str)))
+    replied = len(latencies["all"])
+    print(f"replied to {replied}/{len(requests)} requests in {elapsed:.2f}s -> {replied / elapsed if elapsed > 0 else 0:.1f} requests/s")
+    for kind in ["all"] + sorted(by_kind):
+        values = latencies[kind]
+        print(f"  latency {kind:<6} n={len(values):<5} p50 {percentile(values, 50):7.3f}s  p99 {percentile(values, 99):7.3f}s  max {max(values, default=float('nan')):7.3f}s")
+    print(f"  webhook response      p50 {percentile(webhook_times, 50):7.3f}s  p99 {percentile(webhook_times, 99):7.3f}s")
+    print("upstream calls: " + ", ".join(f"{name}={fake.calls[name]} ({fake.errors[name]} injected errors)" for name in UPSTREAMS))
+    print(f"files uploaded to the fake Drive: {fake.uploads}; meal rows written to the fake sheet: {len(fake.sheet_rows.get('Meal Tracker', []))}")
+    print(f"RSS {rss_after:.1f} MB ({rss_after - rss_before:+.1f} MB during the run)")
+    if tracemalloc.is_tracing():
+        current, peak = tracemalloc.get_traced_memory()
+        print(f"Python heap {current / 2 ** 20:.1f} MB, peak {peak / 2 ** 20:.1f} MB")
+    return problems(args, fake, requests, replied)
+
+
+def problems(args, fake, requests, replied):
+    # Everything that should have reached an upstream but didn't
+    photos = sum(1 for _, _, messages in requests for msg in messages if msg.get("photo"))
+    found = []
+    if replied < len(requests):
+        found.append(f"{len(requests) - replied} requests got no reply")
+    for request, count in fake.unrouted.most_common(5):
+        found.append(f"{count} requests matched no fake upstream: {request}")
+    injected = parse_pairs(args.errors)
+    if not injected.get("drive") and fake.uploads < photos:
+        found.append(f"only {fake.uploads} of {photos} photos were uploaded to Drive")
+    meal_rows = len(fake.sheet_rows.get("Meal Tracker", []))
+    if not injected.get("sheets") and meal_rows < photos:
+        found.append(f"only {meal_rows} of {photos} photos were logged to the Meal Tracker")
+    for problem in found:
+        print(f"PROBLEM: {problem}")
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--updates", type=int, default=200, help="synthetic requests to generate")
+    parser.add_argument("--replay", help="JSONL of recorded Telegram updates")
+    parser.add_argument("--rate", type=float, default=20.0, help="updates per second")
+    parser.add_argument("--mix", default="text=0.7,photo=0.2,album=0.1")
+    parser.add_argument("--album-size", type=int, default=3)
+    parser.add_argument("--latency", default="telegram=0.03,gemini=0.6,drive=0.2,sheets=0.15", help="seconds per upstream")
+    parser.add_argument("--jitter", default="", help="extra random seconds per upstream")
+    parser.add_argument("--errors", default="", help="error rate per upstream, e.g. gemini=0.05")
+    parser.add_argument("--error-status", default="", help="status per upstream (default 503)")
+    parser.add_argument("--reply-chars", type=int, default=400)
+    parser.add_argument("--timeout", type=float, default=60.0, help="seconds to wait for outstanding replies")
+    parser.add_argument("--tracemalloc", action="store_true", help="also report Python heap (slows the run)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    latency, jitter = parse_pairs(args.latency), parse_pairs(args.jitter)
+    errors, error_status = parse_pairs(args.errors), parse_pairs(args.error_status, int)
+    injections = {name: Injection(latency.get(name, 0.0), jitter.get(name, 0.0), errors.get(name, 0.0), error_status.get(name, 503))
+                  for name in UPSTREAMS}
+    fake = FakeUpstreams(injections, reply_chars=args.reply_chars).start()
+    requests = replayed_requests(args.replay) if args.replay else synthetic_requests(args.updates, parse_pairs(args.mix), args.album_size)
+
+    if args.tracemalloc:
+        tracemalloc.start()
+    with tempfile.TemporaryDirectory() as workdir:
+        configure_environment(fake, workdir)
+        try:
+            found = asyncio.run(run(args, fake, requests))
+        finally:
+            fake.stop()
+    if found:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
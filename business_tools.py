@@ -13,21 +13,25 @@ def place_order(order_details):
     # Replace with actual order placement logic
     return f"Order placed successfully! Details: {order_details}"
 
-# Example Gemini tool definitions (for future Gemini tool calling API)
+# Gemini function declarations for the tools above (used by tool_dispatch.ToolDispatcher)
 tools = [
     {
         "name": "get_current_offers",
-        "description": "Get the latest offers and plans.",
-        "parameters": {}
+        "description": "Get the latest offers and plans."
     },
     {
         "name": "get_diet_plans",
-        "description": "Get available diet plans.",
-        "parameters": {}
+        "description": "Get available diet plans."
     },
     {
         "name": "place_order",
         "description": "Place an order for a plan or product.",
-        "parameters": {"order_details": "Details of the order"}
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "order_details": {"type": "string", "description": "Details of the order"}
+            },
+            "required": ["order_details"]
+        }
     }
 ]
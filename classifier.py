@@ -0,0 +1,74 @@
+import json
+import os
+import re
+import threading
+import time
+
+DEFAULT_RULES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "classifier_rules.json")
+
+
+def compile_rules(rules):
+    """Merge every category's patterns into one case-insensitive regex.
+
+    Each category becomes a named group inside a lookahead, so `finditer` tries
+    all categories at every position in one pass and overlapping matches from
+    different categories are still reported. Anchored categories must match
+    the whole (stripped) message.
+    """
+    alternatives = []
+    for category, rule in rules.items():
+        body = "|".join(f"(?:{pattern})" for pattern in rule["patterns"])
+        if rule.get("anchored"):
+            body = rf"\A(?:{body})\Z"
+        alternatives.append(f"(?P<{category}>{body})")
+    return re.compile("(?=" + "|".join(alternatives) + ")", re.IGNORECASE)
+
+
+class MessageClassifier:
+    """Single-pass classifier for the guardrail and intent rules.
+
+    Rules are read from a JSON file mapping category names to pattern lists
+    and reloaded when the file changes (checked at most every
+    `reload_interval` seconds).
+    """
+
+    def __init__(self, path=DEFAULT_RULES_PATH, reload_interval=5.0):
+        self.path = path
+        self.reload_interval = reload_interval
+        self._lock = threading.Lock()
+        self._mtime = None
+        self._checked = 0.0
+        self.reload()
+
+    def reload(self):
+        with open(self.path, encoding='utf-8') as f:
+            rules = json.load(f)
+        regex = compile_rules(rules)
+        with self._lock:
+            self._regex = regex
+            self._mtime = os.path.getmtime(self.path)
+
+    def _maybe_reload(self):
+        now = time.monotonic()
+        if now - self._checked < self.reload_interval:
+            return
+        self._checked = now
+        try:
+            if os.path.getmtime(self.path) != self._mtime:
+                self.reload()
+        except (OSError, ValueError, re.error) as e:
+            # Keep serving the last good rules
+            print(f"Error reloading classifier rules: {e}")
+
+    def classify(self, text):
+        self._maybe_reload()
+        return {match.lastgroup for match in self._regex.finditer(text.strip())}
+
+
+_default = None
+
+def default_classifier():
+    global _default
+    if _default is None:
+        _default = MessageClassifier(os.getenv("CLASSIFIER_RULES_PATH", DEFAULT_RULES_PATH))
+    return _default
@@ -0,0 +1,59 @@
+import httpx
+from modules import GEMINI_MODEL
+from rate_limit import RateLimitedTelegram
+
+
+class ClientRegistry:
+    """Long-lived upstream clients shared by every request in the process.
+
+    Gemini is configured once and `GenerativeModel` objects are cached by name.
+    Telegram Bot API calls go through one pooled keep-alive `httpx.AsyncClient`
+    (created on first use so it binds to the serving event loop) instead of a
+    new client, and a new TCP+TLS handshake, per message. With `telegram_guard`
+    set, Bot API calls are rate limited and retried through it.
+    """
+
+    def __init__(self, gemini_api_key, telegram_token, max_connections=20, max_keepalive=10, timeout=30.0, telegram_guard=None,
+                 telegram_api_url="https://api.telegram.org"):
+        self.gemini_api_key = gemini_api_key
+        self.telegram_token = telegram_token
+        self.telegram_api_url = telegram_api_url
+        self.limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_keepalive)
+        self.timeout = httpx.Timeout(timeout)
+        self._models = {}
+        self._telegram = None
+        self._gemini_configured = False
+        self.telegram_guard = telegram_guard
+
+    def gemini_model(self, name=GEMINI_MODEL, tools=None, system_instruction=None):
+        # Models with function declarations or a system instruction are cached separately
+        key = (name, tuple(tool["name"] for tool in tools) if tools else (), system_instruction)
+        model = self._models.get(key)
+        if model is None:
+            import google.generativeai as genai  # imported on first use to keep cold starts fast
+            if not self._gemini_configured:
+                genai.configure(api_key=self.gemini_api_key)
+                self._gemini_configured = True
+            if tools:
+                model = genai.GenerativeModel(name, tools=[{"function_declarations": tools}], system_instruction=system_instruction)
+            else:
+                model = genai.GenerativeModel(name, system_instruction=system_instruction)
+            self._models[key] = model
+        return model
+
+    @property
+    def telegram(self):
+        if self._telegram is None or self._telegram.is_closed:
+            self._telegram = httpx.AsyncClient(
+                base_url=f"{self.telegram_api_url}/bot{self.telegram_token}/",
+                limits=self.limits,
+                timeout=self.timeout
+            )
+        if self.telegram_guard is not None:
+            return RateLimitedTelegram(self._telegram, self.telegram_guard)
+        return self._telegram
+
+    async def aclose(self):
+        if self._telegram is not None:
+            await self._telegram.aclose()
+            self._telegram = None
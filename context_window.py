@@ -0,0 +1,111 @@
+import asyncio
+from collections import OrderedDict
+from history_store import UserHistory
+from metrics import metrics
+
+
+def estimate_tokens(text):
+    # Gemini averages about 4 characters per token on English text; close enough for budgeting
+    return (len(text) + 3) // 4
+
+
+class ContextWindow:
+    """Conversation context for a Gemini request, kept within `budget` tokens.
+
+    The newest turns from `history_store` go into the prompt verbatim while
+    they fit; older turns are represented by a running summary per user. After
+    a reply has been sent, `summarize_later` checks whether the verbatim turns
+    would overflow the next request and, if so, folds the oldest of them into
+    the summary in the background until they fill half the budget, so
+    summarization runs every few turns and never delays a reply. Summaries are
+    cached per user in LRU order up to `max_users`.
+    """
+
+    def __init__(self, history_store, summarize, budget=1500, summary_tokens=250, reserve=100, max_users=10000):
+        self.history_store = history_store
+        self.summarize = summarize  # async (summary, turns, max_words) -> new summary
+        self.budget = budget
+        self.summary_tokens = summary_tokens
+        self.reserve = reserve  # tokens kept free for the next question when choosing turns to fold
+        self.max_users = max_users
+        self._summaries = OrderedDict()  # user_id -> (summary, number of the newest turn folded into it)
+        self._running = set()
+        self._tasks = set()
+
+    @staticmethod
+    def _split(turns, available):
+        # (older, recent): `recent` is the longest run of newest turns fitting in `available` tokens
+        start, used = len(turns), 0
+        while start > 0:
+            cost = estimate_tokens(UserHistory.render(*turns[start - 1]))
+            if used + cost > available:
+                break
+            used += cost
+            start -= 1
+        return turns[:start], turns[start:]
+
+    @staticmethod
+    def _unfolded(count, turns, folded):
+        # Turns numbered after `folded`, the newest turn in the summary; see HistoryStore.snapshot
+        if folded > count:
+            return turns  # the history was lost (e.g. evicted without a durable store) and restarted
+        return turns[max(0, folded - (count - len(turns))):]
+
+    @staticmethod
+    def _summary_text(summary):
+        return f"Summary of the earlier conversation: {summary}\n" if summary else ""
+
+    def build(self, user_id, user_text):
+        """Returns (context, prompt): the summary plus the verbatim turns that
+        fit the budget, and the full prompt to send for `user_text`."""
+        count, turns, history_prompt = self.history_store.snapshot(user_id)
+        summary, folded = self._summaries.get(user_id, ("", 0))
+        question = f"User: {user_text}\nBot:"
+        summary_text = self._summary_text(summary)
+        available = self.budget - estimate_tokens(question) - estimate_tokens(summary_text)
+        unfolded = self._unfolded(count, turns, folded)
+        if len(unfolded) == len(turns) and estimate_tokens(history_prompt) <= available:
+            # Nothing folded and everything fits: the store's rendered prompt is the context as is
+            context = summary_text + history_prompt
+        else:
+            _, recent = self._split(unfolded, available)
+            context = summary_text + "".join(UserHistory.render(*turn) for turn in recent)
+        prompt = context + question if context else user_text
+        metrics.inc("bot_prompt_tokens_total", {"prompt": "windowed"}, estimate_tokens(prompt))
+        metrics.inc("bot_prompt_tokens_total", {"prompt": "full_history"},
+                    estimate_tokens(history_prompt + question if history_prompt else user_text))
+        return context, prompt
+
+    def summarize_later(self, user_id):
+        # Call once the reply is out; at most one summarization runs per user at a time
+        if user_id in self._running:
+            return
+        self._running.add(user_id)
+        task = asyncio.create_task(self._fold(user_id))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _fold(self, user_id):
+        try:
+            count, turns, _ = self.history_store.snapshot(user_id)
+            summary, folded = self._summaries.get(user_id, ("", 0))
+            unfolded = self._unfolded(count, turns, folded)
+            limit = self.budget - self.reserve - self.summary_tokens
+            if sum(estimate_tokens(UserHistory.render(*turn)) for turn in unfolded) <= limit:
+                return
+            pending, _ = self._split(unfolded, limit // 2)
+            if not pending:
+                return
+            summary = await self.summarize(summary, pending, max_words=self.summary_tokens * 3 // 4)
+            # `unfolded` ends at turn `count`; the fold point is kept as a turn number, not a turn's text
+            self._summaries[user_id] = (summary.strip(), count - len(unfolded) + len(pending))
+            self._summaries.move_to_end(user_id)
+            while len(self._summaries) > self.max_users:
+                self._summaries.popitem(last=False)
+        except Exception as e:
+            print(f"Error summarizing history for {user_id}: {e}")
+        finally:
+            self._running.discard(user_id)
+
+    def stats(self):
+        return {"summaries": len(self._summaries), "running": len(self._running)}
@@ -0,0 +1,117 @@
+import base64
+import json
+import os
+import pickle
+import threading
+import time
+
+SCOPES = ['https://www.googleapis.com/auth/drive', 'https://www.googleapis.com/auth/spreadsheets']
+
+
+class GoogleServices:
+    """Google Drive and Sheets clients, built on first use.
+
+    Nothing here touches the network at import time: OAuth credentials are
+    unpickled, and the API clients built from the discovery documents bundled
+    with google-api-python-client, the first time they are needed. Each thread
+    gets its own clients, since a client's httplib2.Http is not thread-safe,
+    while the credentials are shared. `warm_up` loads the credentials and
+    client library in a background thread right after startup, and a
+    refresher thread renews the access token `refresh_margin` seconds before
+    it expires so request handlers never wait on a refresh.
+    """
+
+    def __init__(self, token_pickle='token.pickle', client_secret_json=None, refresh_margin=300):
+        self.token_pickle = token_pickle
+        self.client_secret_json = client_secret_json
+        self.refresh_margin = refresh_margin
+        self._creds = None
+        self._local = threading.local()  # this thread's clients, by API name
+        self._lock = threading.RLock()
+        self._refresher = None
+
+    def credentials(self):
+        with self._lock:
+            if self._creds is None:
+                self._creds = self._load_credentials()
+                self._start_refresher()
+            return self._creds
+
+    def _load_credentials(self):
+        from google.auth.transport.requests import Request as GoogleAuthRequest
+        creds = None
+        token_str = os.getenv("GOOGLE_OAUTH_TOKEN_PICKLE")
+        if token_str:
+            creds = pickle.loads(base64.b64decode(token_str))
+        else:
+            raise Exception("OAuth token not found in environment variables")
+        if os.path.exists(self.token_pickle):
+            with open(self.token_pickle, 'rb') as token:
+                creds = pickle.load(token)
+        if not creds or not creds.valid:
+            if creds and creds.expired and creds.refresh_token:
+                creds.refresh(GoogleAuthRequest())
+            else:
+                from google_auth_oauthlib.flow import InstalledAppFlow
+                client_config = json.loads(self.client_secret_json)
+                flow = InstalledAppFlow.from_client_config(client_config, SCOPES)
+                creds = flow.run_local_server(access_type='offline', prompt='consent')
+            self._save_credentials(creds)
+        return creds
+
+    def _save_credentials(self, creds):
+        try:
+            with open(self.token_pickle, 'wb') as token:
+                pickle.dump(creds, token)
+        except OSError as e:
+            # Read-only filesystem on serverless; the in-memory credentials still work
+            print(f"Could not save OAuth token: {e}")
+
+    def _start_refresher(self):
+        if self._refresher is None and self._creds.refresh_token:
+            self._refresher = threading.Thread(target=self._refresh_loop, name="oauth-refresh", daemon=True)
+            self._refresher.start()
+
+    def _refresh_loop(self):
+        from datetime import datetime
+        from google.auth.transport.requests import Request as GoogleAuthRequest
+        while True:
+            expiry = self._creds.expiry
+            # google-auth stores expiry as a naive UTC datetime
+            wait = (expiry - datetime.utcnow()).total_seconds() - self.refresh_margin if expiry else 3600
+            time.sleep(max(wait, 30))
+            try:
+                with self._lock:
+                    self._creds.refresh(GoogleAuthRequest())
+                self._save_credentials(self._creds)
+            except Exception as e:
+                print(f"Error refreshing OAuth token: {e}")
+
+    @property
+    def drive(self):
+        return self._client('drive', 'v3')
+
+    @property
+    def sheets(self):
+        return self._client('sheets', 'v4')
+
+    def _client(self, name, version):
+        client = getattr(self._local, name, None)
+        if client is None:
+            client = self._build(name, version)
+            setattr(self._local, name, client)
+        return client
+
+    def _build(self, name, version):
+        from googleapiclient.discovery import build
+        # static_discovery uses the bundled discovery document instead of fetching it
+        return build(name, version, credentials=self.credentials(), static_discovery=True, cache_discovery=False)
+
+    def warm_up(self):
+        def build_all():
+            try:
+                self.drive
+                self.sheets
+            except Exception as e:
+                print(f"Error initializing Google services: {e}")
+        threading.Thread(target=build_all, name="google-warm-up", daemon=True).start()
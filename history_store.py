@@ -0,0 +1,143 @@
+import sqlite3
+import threading
+from collections import OrderedDict, deque
+
+
+class UserHistory:
+    """Last `max_turns` exchanges of one user plus the rendered prompt text.
+
+    The prompt is kept up to date on append by dropping the oldest rendered
+    turn and adding the new one, instead of re-joining every turn. `count` is
+    the number of turns the user has had in total, so the last turn held is
+    turn number `count`.
+    """
+    __slots__ = ("turns", "prompt", "size", "count")
+
+    def __init__(self, max_turns):
+        self.turns = deque(maxlen=max_turns)
+        self.prompt = ""
+        self.size = 0
+        self.count = 0
+
+    @staticmethod
+    def render(user_text, reply):
+        return f"User: {user_text}\nBot: {reply}\n"
+
+    def append(self, user_text, reply):
+        if len(self.turns) == self.turns.maxlen:
+            oldest = self.render(*self.turns[0])
+            self.prompt = self.prompt[len(oldest):]
+        self.turns.append((user_text, reply))
+        self.prompt += self.render(user_text, reply)
+        self.size = len(self.prompt)
+        self.count += 1
+
+
+class HistoryStore:
+    """In-memory conversation history keyed by Telegram user ID.
+
+    Users are kept in LRU order; once more than `max_users` are held or their
+    prompts add up to more than `max_chars`, the least recently active users
+    are evicted. Subclasses can back the store with durable storage by
+    overriding `_load` (returning the last turns and the user's turn count)
+    and `_save`.
+    """
+
+    def __init__(self, max_turns=10, max_users=10000, max_chars=50_000_000):
+        self.max_turns = max_turns
+        self.max_users = max_users
+        self.max_chars = max_chars
+        self._users = OrderedDict()
+        self._chars = 0
+        self._lock = threading.Lock()
+
+    def _get(self, user_id):
+        history = self._users.get(user_id)
+        if history is None:
+            history = UserHistory(self.max_turns)
+            turns, count = self._load(user_id)
+            for user_text, reply in turns:
+                history.append(user_text, reply)
+            history.count = max(history.count, count)
+            self._users[user_id] = history
+            self._chars += history.size
+            self._evict()
+        self._users.move_to_end(user_id)
+        return history
+
+    def _evict(self):
+        while len(self._users) > 1 and (len(self._users) > self.max_users or self._chars > self.max_chars):
+            _, history = self._users.popitem(last=False)
+            self._chars -= history.size
+
+    def prompt(self, user_id):
+        with self._lock:
+            return self._get(user_id).prompt
+
+    def turns(self, user_id):
+        with self._lock:
+            return list(self._get(user_id).turns)
+
+    def snapshot(self, user_id):
+        # (count, turns, prompt) read together; turns[-1] is turn number `count`, turns[0] is count - len(turns) + 1
+        with self._lock:
+            history = self._get(user_id)
+            return history.count, list(history.turns), history.prompt
+
+    def append(self, user_id, user_text, reply):
+        with self._lock:
+            history = self._get(user_id)
+            before = history.size
+            history.append(user_text, reply)
+            self._chars += history.size - before
+            self._evict()
+            turn = history.count
+        self._save(user_id, user_text, reply, turn)
+
+    def _load(self, user_id):
+        return [], 0
+
+    def _save(self, user_id, user_text, reply, turn):
+        pass
+
+
+class SQLiteHistoryStore(HistoryStore):
+    """HistoryStore that persists every turn to SQLite and reloads evicted or
+    cold-started users from it."""
+
+    def __init__(self, path, **kwargs):
+        super().__init__(**kwargs)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db_lock = threading.Lock()
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS history ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, user_id INTEGER, user_text TEXT, reply TEXT)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS history_user ON history (user_id, id)")
+        if "turn" not in [column[1] for column in self._db.execute("PRAGMA table_info(history)")]:
+            # Databases from before turn numbers; their rows count from the oldest one kept
+            self._db.execute("ALTER TABLE history ADD COLUMN turn INTEGER")
+        self._db.commit()
+
+    def _load(self, user_id):
+        with self._db_lock:
+            rows = self._db.execute(
+                "SELECT user_text, reply, turn FROM history WHERE user_id = ? ORDER BY id DESC LIMIT ?",
+                (user_id, self.max_turns)
+            ).fetchall()
+        count = (rows[0][2] or 0) if rows else 0
+        return [(user_text, reply) for user_text, reply, _ in reversed(rows)], count
+
+    def _save(self, user_id, user_text, reply, turn):
+        with self._db_lock:
+            self._db.execute(
+                "INSERT INTO history (user_id, user_text, reply, turn) VALUES (?, ?, ?, ?)",
+                (user_id, user_text, reply, turn)
+            )
+            # Only the last max_turns rows are ever read back
+            self._db.execute(
+                "DELETE FROM history WHERE user_id = ? AND id NOT IN "
+                "(SELECT id FROM history WHERE user_id = ? ORDER BY id DESC LIMIT ?)",
+                (user_id, user_id, self.max_turns)
+            )
+            self._db.commit()
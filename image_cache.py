@@ -0,0 +1,151 @@
+import hashlib
+import io
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from modules import MealTrackerEntry, NUTRIENT_FIELDS
+
+ENTRY_FIELDS = ("food",) + NUTRIENT_FIELDS
+
+
+def _number(value):
+    # Records written before structured output hold strings such as "250" or ""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def content_hash(image_bytes):
+    return hashlib.sha256(image_bytes).hexdigest()
+
+
+def perceptual_hash(image_bytes):
+    # 64-bit difference hash; None when Pillow is missing or the image can't be decoded
+    try:
+        from PIL import Image
+    except ImportError:
+        return None
+    try:
+        image = Image.open(io.BytesIO(image_bytes)).convert('L').resize((9, 8))
+    except Exception:
+        return None
+    pixels = list(image.getdata())
+    bits = 0
+    for row in range(8):
+        for col in range(8):
+            bits = (bits << 1) | (pixels[row * 9 + col] > pixels[row * 9 + col + 1])
+    return bits
+
+
+class ImageAnalysisCache:
+    """Cache of meal analysis results keyed by image content.
+
+    Lookups go by Telegram `file_unique_id` (before downloading), then by SHA-256
+    of the bytes, then by perceptual hash within `max_distance` bits so
+    re-encoded copies of the same photo match. Entries are kept in LRU order up
+    to `max_entries`, expire after `ttl` seconds and are mirrored to SQLite when
+    `path` is given so they survive cold starts.
+    """
+
+    def __init__(self, path=None, max_entries=1000, ttl=7 * 24 * 3600, max_distance=4):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_distance = max_distance
+        self._entries = OrderedDict()  # content hash -> record
+        self._by_file_id = {}
+        self._lock = threading.Lock()
+        self._db = None
+        if path:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS image_cache ("
+                "hash TEXT PRIMARY KEY, file_unique_id TEXT, phash TEXT, record TEXT, created REAL)"
+            )
+            self._load()
+
+    def _load(self):
+        rows = self._db.execute(
+            "SELECT hash, file_unique_id, phash, record, created FROM image_cache "
+            "WHERE created > ? ORDER BY created DESC LIMIT ?",
+            (time.time() - self.ttl, self.max_entries)
+        ).fetchall()
+        for key, file_unique_id, phash, record, created in reversed(rows):
+            phash = int(phash, 16) if phash else None
+            self._put(key, dict(json.loads(record), file_unique_id=file_unique_id, phash=phash, created=created))
+
+    def _put(self, key, record):
+        self._entries[key] = record
+        self._entries.move_to_end(key)
+        if record.get("file_unique_id"):
+            self._by_file_id[record["file_unique_id"]] = key
+        while len(self._entries) > self.max_entries:
+            self._drop(next(iter(self._entries)))
+
+    def _drop(self, key):
+        record = self._entries.pop(key, None)
+        if record and record.get("file_unique_id"):
+            self._by_file_id.pop(record["file_unique_id"], None)
+        if self._db is not None:
+            self._db.execute("DELETE FROM image_cache WHERE hash = ?", (key,))
+            self._db.commit()
+
+    def _get(self, key):
+        record = self._entries.get(key)
+        if record is None:
+            return None
+        if time.time() - record["created"] > self.ttl:
+            self._drop(key)
+            return None
+        self._entries.move_to_end(key)
+        return record
+
+    def lookup_file(self, file_unique_id):
+        with self._lock:
+            key = self._by_file_id.get(file_unique_id)
+            return self._get(key) if key else None
+
+    def lookup(self, image_bytes):
+        with self._lock:
+            record = self._get(content_hash(image_bytes))
+            if record is not None:
+                return record
+            phash = perceptual_hash(image_bytes)
+            if phash is None:
+                return None
+            for key, candidate in list(self._entries.items()):
+                if candidate.get("phash") is not None and bin(candidate["phash"] ^ phash).count("1") <= self.max_distance:
+                    return self._get(key)
+            return None
+
+    def store(self, image_bytes, entry, text, drive_file_id, file_unique_id=None):
+        key = content_hash(image_bytes)
+        record = {field: getattr(entry, field) for field in ENTRY_FIELDS}
+        record.update(text=text, drive_file_id=drive_file_id or "")
+        created = time.time()
+        phash = perceptual_hash(image_bytes)
+        with self._lock:
+            self._put(key, dict(record, file_unique_id=file_unique_id, phash=phash, created=created))
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO image_cache (hash, file_unique_id, phash, record, created) VALUES (?, ?, ?, ?, ?)",
+                    (key, file_unique_id, format(phash, 'x') if phash is not None else None, json.dumps(record), created)
+                )
+                self._db.commit()
+
+    @staticmethod
+    def to_entry(record):
+        # Fresh MealTrackerEntry for a cache hit, stamped with the current time
+        now = datetime.now()
+        drive_file_id = record.get("drive_file_id")
+        return MealTrackerEntry(
+            date=now.strftime('%Y-%m-%d'),
+            time=now.strftime('%H:%M:%S'),
+            image_url=f"https://drive.google.com/uc?id={drive_file_id}" if drive_file_id else "",
+            time_elapsed=0.0,
+            food=record["food"],
+            **{field: _number(record[field]) for field in NUTRIENT_FIELDS}
+        )
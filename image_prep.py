@@ -0,0 +1,33 @@
+import io
+
+
+def choose_photo_size(photo_sizes, target):
+    """Smallest Telegram PhotoSize whose longer side is at least `target` px,
+    or the largest one when none is big enough."""
+    ordered = sorted(photo_sizes, key=lambda size: max(size.width, size.height))
+    for size in ordered:
+        if max(size.width, size.height) >= target:
+            return size
+    return ordered[-1]
+
+
+def prepare_for_analysis(image_bytes, max_side=1024, quality=85):
+    """Downscale to `max_side` px on the longer side and re-encode as JPEG
+    without EXIF metadata. Returns the input unchanged if Pillow is missing or
+    the image can't be decoded."""
+    try:
+        from PIL import Image, ImageOps
+    except ImportError:
+        return image_bytes
+    try:
+        image = Image.open(io.BytesIO(image_bytes))
+        image = ImageOps.exif_transpose(image)  # apply the orientation before the tag is dropped
+        if image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+        image.thumbnail((max_side, max_side))
+        out = io.BytesIO()
+        image.save(out, format="JPEG", quality=quality, optimize=True)
+    except Exception as e:
+        print(f"Error preparing image for analysis: {e}")
+        return image_bytes
+    return out.getvalue()
@@ -1,17 +1,29 @@
 import os
-import re
-from fastapi import FastAPI, Request
+import asyncio
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import PlainTextResponse
 from telegram import Update
 from telegram.ext import Application, MessageHandler, ContextTypes, filters
-import httpx
-from modules import WelcomeModule, ConversationModule, ImageCalorieModule, GoogleSheetsModule, GoogleDriveModule
-from business_tools import get_current_offers, get_diet_plans, place_order
+from modules import WelcomeModule, GoogleSheetsModule, NO_RESPONSE, BLOCKED_RESPONSE
+from sheet_logger import MEAL_TRACKER_TAB, SheetLogger
+from services import AsyncServices
+from image_cache import ImageAnalysisCache
+from history_store import SQLiteHistoryStore
+from clients import ClientRegistry
+from streaming import StreamingReply, split_markdown
+from classifier import default_classifier
+from response_cache import ResponseCache
+from tool_dispatch import business_dispatcher
+from webhook_queue import QueueFull, SQLiteUpdateStore, UpdateQueue
+from rate_limit import CircuitOpen, UpstreamGuard
+from metrics import SIZE_BUCKETS, SamplingProfiler, metrics
+from image_prep import choose_photo_size, prepare_for_analysis
+from album_batcher import AlbumBatcher
+from nutrition import NutritionTotals
+from context_window import ContextWindow
+from google_services import GoogleServices
 from dotenv import load_dotenv
-import pickle
-import base64
-from google_auth_oauthlib.flow import InstalledAppFlow
-from google.auth.transport.requests import Request as GoogleAuthRequest
-from googleapiclient.discovery import build
 
 load_dotenv()
 
@@ -22,41 +34,126 @@ GOOGLE_DRIVE_FOLDER_ID = os.getenv("GOOGLE_DRIVE_FOLDER_ID")
 CLIENT_SECRET = os.getenv("CLIENT_SECRET_FILE")
 # GOOGLE_CREDENTIALS_JSON = os.getenv("GOOGLE_CREDENTIALS_JSON")
 
-app = FastAPI()
-application = Application.builder().token(TELEGRAM_TOKEN).build()
-
-# Google API clients using OAuth
-SCOPES = ['https://www.googleapis.com/auth/drive', 'https://www.googleapis.com/auth/spreadsheets']
-TOKEN_PICKLE = 'token.pickle'
-CLIENT_SECRET_JSON = os.getenv("GOOGLE_CLIENT_SECRET_JSON")
-
-creds = None
-# In-memory chat history per user (for prototyping; use a database for production)
-user_histories = {}
-
-token_str = os.getenv("GOOGLE_OAUTH_TOKEN_PICKLE")
-if token_str:
-    creds = pickle.loads(base64.b64decode(token_str))
-else:
-    raise Exception("OAuth token not found in environment variables")
-
-if os.path.exists(TOKEN_PICKLE):
-    with open(TOKEN_PICKLE, 'rb') as token:
-        creds = pickle.load(token)
-if not creds or not creds.valid:
-    if creds and creds.expired and creds.refresh_token:
-        creds.refresh(GoogleAuthRequest())
-    else:
-        import json
-        client_config = json.loads(CLIENT_SECRET_JSON)
-        flow = InstalledAppFlow.from_client_config(client_config, SCOPES)
-        creds = flow.run_local_server(access_type='offline', prompt='consent')
-    with open(TOKEN_PICKLE, 'wb') as token:
-        pickle.dump(creds, token)
-drive_service = build('drive', 'v3', credentials=creds)
-sheets_service = build('sheets', 'v4', credentials=creds)
+@asynccontextmanager
+async def lifespan(app):
+    yield
+    if update_queue is not None:
+        await update_queue.stop()
+    sheet_logger.stop()
+    services.shutdown()
+    await clients.aclose()
+
+app = FastAPI(lifespan=lifespan)
+# Overridable so benchmarks can point the bot at a local Bot API stand-in
+TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL", "https://api.telegram.org")
+application = (
+    Application.builder().token(TELEGRAM_TOKEN)
+    .base_url(f"{TELEGRAM_API_URL}/bot").base_file_url(f"{TELEGRAM_API_URL}/file/bot")
+    .build()
+)
+
+# Google API clients using OAuth, built lazily and kept warm
+google = GoogleServices(
+    token_pickle='token.pickle',
+    client_secret_json=os.getenv("GOOGLE_CLIENT_SECRET_JSON")
+)
+google.warm_up()
+
+# Per-upstream token buckets, retries with backoff and circuit breakers
+guards = {
+    "gemini": UpstreamGuard("gemini", rate=float(os.getenv("GEMINI_RPS", "10")), burst=10),
+    "sheets": UpstreamGuard("sheets", rate=float(os.getenv("SHEETS_RPS", "1")), burst=5),
+    "drive": UpstreamGuard("drive", rate=float(os.getenv("DRIVE_RPS", "10")), burst=10),
+    # Telegram allows about 30 messages/s overall and 1/s per chat
+    "telegram": UpstreamGuard("telegram", rate=float(os.getenv("TELEGRAM_RPS", "30")), burst=30,
+                              per_chat_rate=float(os.getenv("TELEGRAM_CHAT_RPS", "1")), per_chat_burst=3),
+}
+
+# Chat and meal rows are queued and flushed to Sheets in the background
+sheet_logger = SheetLogger(
+    lambda: google.sheets, GOOGLE_SHEET_ID,
+    spool_path=os.getenv("SHEET_SPOOL_PATH", "/tmp/sheet_spool.jsonl"),
+    max_batch=int(os.getenv("SHEET_FLUSH_ROWS", "20")),
+    flush_interval=float(os.getenv("SHEET_FLUSH_SECONDS", "5")),
+    guard=guards["sheets"]
+)
+sheet_logger.start()
+
+# Analysis results for photos we've already seen, keyed by image content
+image_cache = ImageAnalysisCache(
+    path=os.getenv("IMAGE_CACHE_PATH", "/tmp/image_cache.sqlite3"),
+    max_entries=int(os.getenv("IMAGE_CACHE_SIZE", "1000")),
+    ttl=float(os.getenv("IMAGE_CACHE_TTL", str(7 * 24 * 3600)))
+)
+
+# Guardrail and intent rules, compiled into a single regex
+classifier = default_classifier()
+
+# Opt-in cache of Gemini replies for repeated and near-duplicate questions
+response_cache = None
+if os.getenv("RESPONSE_CACHE", "false").lower() == "true":
+    response_cache = ResponseCache(
+        max_entries=int(os.getenv("RESPONSE_CACHE_SIZE", "5000")),
+        ttl=float(os.getenv("RESPONSE_CACHE_TTL", "3600")),
+        threshold=float(os.getenv("RESPONSE_CACHE_THRESHOLD", "0.9"))
+    )
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+
+# Per-client daily/weekly nutrition totals, updated as meals are logged
+nutrition = NutritionTotals(os.getenv("NUTRITION_DB_PATH", "/tmp/nutrition.sqlite3"))
+
+# Chat history per Telegram user ID, bounded in memory and persisted to SQLite
+history_store = SQLiteHistoryStore(
+    os.getenv("HISTORY_DB_PATH", "/tmp/chat_history.sqlite3"),
+    max_turns=10,
+    max_users=int(os.getenv("HISTORY_MAX_USERS", "10000"))
+)
+
+# Pooled keep-alive clients for Gemini and the Telegram Bot API, shared by all requests
+clients = ClientRegistry(
+    GEMINI_API_KEY, TELEGRAM_TOKEN,
+    max_connections=int(os.getenv("TELEGRAM_MAX_CONNECTIONS", "20")),
+    max_keepalive=int(os.getenv("TELEGRAM_MAX_KEEPALIVE", "10")),
+    timeout=float(os.getenv("UPSTREAM_TIMEOUT", "30")),
+    telegram_guard=guards["telegram"],
+    telegram_api_url=TELEGRAM_API_URL
+)
+
+# Gemini and Drive calls are awaited here instead of blocking the event loop
+services = AsyncServices(
+    GEMINI_API_KEY,
+    clients=clients,
+    guards=guards,
+    max_workers=int(os.getenv("SERVICE_THREADS", "8")),
+    limits={
+        "gemini": int(os.getenv("GEMINI_CONCURRENCY", "8")),
+        "drive": int(os.getenv("DRIVE_CONCURRENCY", "4")),
+        "sheets": int(os.getenv("SHEETS_CONCURRENCY", "2")),
+        # Local image work (resizing, perceptual hashes) shares the pool but never takes all of it
+        "images": int(os.getenv("IMAGE_CONCURRENCY", "4")),
+        # Local SQLite reads and writes (chat history, nutrition totals)
+        "storage": int(os.getenv("STORAGE_CONCURRENCY", "4")),
+    }
+)
+
+# Offer, plan and order questions are answered by business_tools, locally when unambiguous
+tool_dispatcher = business_dispatcher(services)
+
+# Conversation context within a token budget; older turns are folded into a per-user summary
+context_window = ContextWindow(
+    history_store, services.summarize,
+    budget=int(os.getenv("CONTEXT_TOKEN_BUDGET", "1500")),
+    summary_tokens=int(os.getenv("CONTEXT_SUMMARY_TOKENS", "250"))
+)
 
 MAX_TELEGRAM_MSG_LENGTH = 4096
+# Stream chat replies into Telegram as Gemini generates them
+STREAM_REPLIES = os.getenv("STREAM_REPLIES", "false").lower() == "true"
+STREAM_EDIT_INTERVAL = float(os.getenv("STREAM_EDIT_INTERVAL", "1.0"))
+WEBHOOK_QUEUE = os.getenv("WEBHOOK_QUEUE", "").lower()
+# Longer side, in px, of the image sent to Gemini; the original is only archived
+ANALYSIS_MAX_SIDE = int(os.getenv("ANALYSIS_MAX_SIDE", "1024"))
+ANALYSIS_JPEG_QUALITY = int(os.getenv("ANALYSIS_JPEG_QUALITY", "85"))
 
 
 # Handler for text messages
@@ -64,20 +161,6 @@ async def handle_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_text = update.message.text if update.message else None
     reply = None
 
-    welcome_patterns = [
-        r"^hi+$", r"^hey+$", r"^hello+$", r"^hii+$", r"^hel+o+$", r"^heya+$",
-        r"^yo+$", r"^greetings+$", r"^sup+$", r"^start$"
-    ]
-
-    jailbreak_patterns = [
-        r"who (are|r) you", r"who made you", r"who is your creator",
-        r"who created you", r"are you real", r"are you sentient",
-        r"can you break rules", r"can you ignore instructions",
-        r"ignore previous instructions", r"jailbreak",
-        r"prompt injection", r"what tools do you use",
-        r"show your code", r"reveal your instructions"
-    ]
-
     if update.effective_user:
         first_name = update.effective_user.first_name or ""
         last_name = update.effective_user.last_name or ""
@@ -85,28 +168,54 @@ async def handle_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
     else:
         username = "Unknown"
 
-    if username not in user_histories:
-        user_histories[username] = []
+    user_id = update.effective_user.id if update.effective_user else 0
 
-    history = user_histories[username][-10:]  # Last 10 exchanges
-    history_prompt = "".join(f"User: {msg}\nBot: {resp}\n" for msg, resp in history)
-
-    if any(re.search(pat, user_text, re.IGNORECASE) for pat in jailbreak_patterns):
+    with metrics.span("classify"):
+        categories = classifier.classify(user_text)
+    if "jailbreak" in categories:
         reply = "I am an AI assistant."
-    elif any(re.match(pat, user_text.strip().lower()) for pat in welcome_patterns):
+    elif "welcome" in categories:
         reply = WelcomeModule.welcome_message()
+    elif "blocked" in categories:
+        reply = BLOCKED_RESPONSE
+    elif "nutrition" in categories:
+        reply = await services.run_blocking("storage", nutrition.summary, user_id, "week" if "week" in user_text.lower() else "day")
+    elif (reply := tool_dispatcher.local_answer(user_text, categories)) is not None:
+        pass  # e.g. "what are your plans": answered from business_tools without context or Gemini
+    elif categories & tool_dispatcher.intents:
+        with metrics.span("history"):
+            _, full_prompt = await services.run_blocking("storage", context_window.build, user_id, user_text)
+        reply = await tool_dispatcher.dispatch(full_prompt)
     else:
-        full_prompt = (history_prompt + f"User: {user_text}\nBot:") if history_prompt else user_text
-        reply = ConversationModule.get_response(full_prompt, GEMINI_API_KEY)
+        with metrics.span("history"):
+            # Cold users are loaded from SQLite here, so this runs on the worker pool
+            history_context, full_prompt = await services.run_blocking("storage", context_window.build, user_id, user_text)
+        cache_partition = ResponseCache.partition_for(user_id, history_context)
+        reply = response_cache.get(cache_partition, user_text) if response_cache else None
+        if response_cache:
+            metrics.inc("bot_cache_lookups_total", {"cache": "response", "result": "hit" if reply is not None else "miss"})
+        if reply is None and STREAM_REPLIES:
+            reply, complete = await stream_reply(update.effective_chat.id, full_prompt)
+            if response_cache and complete:
+                response_cache.put(cache_partition, user_text, reply)
+            with metrics.span("history"):
+                await services.run_blocking("storage", history_store.append, user_id, user_text, reply)
+            metrics.observe("bot_payload_bytes", {"kind": "reply"}, len(reply.encode()), buckets=SIZE_BUCKETS)
+            sheet_logger.log_chat_history(username, user_text, reply)
+            context_window.summarize_later(user_id)
+            return
+        if reply is None:
+            reply = await services.get_response(full_prompt)
+            # Fallback texts are not answers; caching them would serve the failure for the whole TTL
+            if response_cache and reply not in (NO_RESPONSE, BLOCKED_RESPONSE):
+                response_cache.put(cache_partition, user_text, reply)
 
     # Update history
-    user_histories[username].append((user_text, reply))
-    user_histories[username] = user_histories[username][-10:]
+    with metrics.span("history"):
+        await services.run_blocking("storage", history_store.append, user_id, user_text, reply)
+    metrics.observe("bot_payload_bytes", {"kind": "reply"}, len(reply.encode()), buckets=SIZE_BUCKETS)
 
-    GoogleSheetsModule.log_chat_history(
-        sheets_service, GOOGLE_SHEET_ID,
-        username, user_text, reply
-    )
+    sheet_logger.log_chat_history(username, user_text, reply)
 
     if len(reply) > MAX_TELEGRAM_MSG_LENGTH:
         reply = reply[:MAX_TELEGRAM_MSG_LENGTH]
@@ -118,34 +227,58 @@ async def handle_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
     safe_reply = reply if is_markdown_structured(reply) else sanitize_markdown(reply)
 
     try:
-        async with httpx.AsyncClient() as client:
-            resp = await client.post(
-                f"https://api.telegram.org/bot{TELEGRAM_TOKEN}/sendMessage",
+        resp = await clients.telegram.post(
+            "sendMessage",
+            json={
+                "chat_id": update.effective_chat.id,
+                "text": safe_reply,
+                "parse_mode": "Markdown"
+            }
+        )
+        if resp.status_code == 400:
+            # Fallback: plain text when Telegram can't parse the Markdown
+            await clients.telegram.post(
+                "sendMessage",
                 json={
                     "chat_id": update.effective_chat.id,
-                    "text": safe_reply,
-                    "parse_mode": "Markdown"
+                    "text": reply
                 }
             )
-            if resp.status_code != 200:
-                # Fallback: plain text
-                await client.post(
-                    f"https://api.telegram.org/bot{TELEGRAM_TOKEN}/sendMessage",
-                    json={
-                        "chat_id": update.effective_chat.id,
-                        "text": reply
-                    }
-                )
     except Exception as e:
         print(f"Error sending message to Telegram: {e}")
-        async with httpx.AsyncClient() as client:
-            await client.post(
-                f"https://api.telegram.org/bot{TELEGRAM_TOKEN}/sendMessage",
-                json={
-                    "chat_id": update.effective_chat.id,
-                    "text": "Sorry, there was an error delivering your message."
-                }
-            )
+        await send_error_notice(update.effective_chat.id)
+    # Fold turns that no longer fit the token budget into the summary, now that the reply is out
+    context_window.summarize_later(user_id)
+
+async def stream_reply(chat_id, prompt):
+    # Send the Gemini reply progressively, editing the message as chunks arrive.
+    # Returns (reply, complete); complete is False for partial or fallback replies.
+    streaming = StreamingReply(clients.telegram, chat_id, edit_interval=STREAM_EDIT_INTERVAL)
+    try:
+        async for chunk in services.stream_response(prompt):
+            await streaming.feed(chunk)
+        reply = await streaming.finish()
+    except Exception as e:
+        complete = False
+        print(f"Error streaming reply to Telegram: {e}")
+        reply = streaming.full_text
+        await send_error_notice(chat_id)
+    else:
+        complete = bool(reply) and reply not in (NO_RESPONSE, BLOCKED_RESPONSE)
+    return reply or NO_RESPONSE, complete
+
+async def send_error_notice(chat_id):
+    # Best effort: while Telegram's circuit is open this would only raise CircuitOpen again
+    try:
+        await clients.telegram.post(
+            "sendMessage",
+            json={
+                "chat_id": chat_id,
+                "text": "Sorry, there was an error delivering your message."
+            }
+        )
+    except CircuitOpen:
+        pass
 
 def sanitize_markdown(text):
     import re
@@ -155,15 +288,33 @@ def sanitize_markdown(text):
     text = re.sub(chars_to_escape, r'\\\1', text)
     return text
 
+async def download_photo(context, photo_size):
+    file = await context.bot.get_file(photo_size.file_id)
+    return bytes(await file.download_as_bytearray())
+
 # Handler for photo messages (with or without caption)
 async def handle_photo(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if update.message.media_group_id:
+        # Photos of an album are analyzed together once the whole group has arrived
+        album_batcher.add(update.message.media_group_id, (update, context))
+        return
     reply = None
     caption = update.message.caption if update.message and update.message.caption else ""
     user_text = caption
-    photo = update.message.photo[-1]
-    file_id = photo.file_id
-    file = await context.bot.get_file(file_id)
-    image_bytes = bytes(await file.download_as_bytearray())
+    # The largest size is archived to Drive; analysis uses the smallest one that is big enough
+    original = update.message.photo[-1]
+    photo = choose_photo_size(update.message.photo, ANALYSIS_MAX_SIDE)
+    # Resent or forwarded photos keep their file_unique_id, so a hit skips the download too
+    cached = image_cache.lookup_file(original.file_unique_id)
+    downloaded = image_bytes = None
+    if cached is None:
+        with metrics.span("download"):
+            downloaded = await download_photo(context, photo)
+        metrics.observe("bot_payload_bytes", {"kind": "image"}, len(downloaded), buckets=SIZE_BUCKETS)
+        # Decoding, resizing and hashing are CPU-bound; keep them off the event loop
+        image_bytes = await services.run_blocking("images", prepare_for_analysis, downloaded, ANALYSIS_MAX_SIDE, ANALYSIS_JPEG_QUALITY)
+        cached = await services.run_blocking("images", image_cache.lookup, image_bytes)
+    metrics.inc("bot_cache_lookups_total", {"cache": "image", "result": "hit" if cached is not None else "miss"})
     # Get username and timestamp for file naming
     from datetime import datetime
     if update.effective_user:
@@ -172,52 +323,228 @@ async def handle_photo(update: Update, context: ContextTypes.DEFAULT_TYPE):
         username = (first_name + " " + last_name).strip() if (first_name or last_name) else str(update.effective_user.id)
     else:
         username = "Unknown"
-    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-    image_filename = f"{username}_{timestamp}.jpg"
-    # Upload to Google Drive
-    drive_file_id = GoogleDriveModule.upload_image(drive_service, GOOGLE_DRIVE_FOLDER_ID, image_filename, image_bytes)
-    picture_url = f"https://drive.google.com/uc?id={drive_file_id}"
-    # Analyze image
     import time
     start_time = time.time()
-    entry, text = ImageCalorieModule.analyze_image(image_bytes, GEMINI_API_KEY, image_url=picture_url, time_elapsed=None)
+    upload_task = None
+    if cached is not None:
+        entry, text = image_cache.to_entry(cached), cached["text"]
+        drive_note = "_Image already saved to Google Drive._"
+    else:
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        image_filename = f"{username}_{timestamp}.jpg"
+        # Upload the original to Google Drive while the image is analyzed; only the meal log needs the file ID
+        async def archive_original():
+            original_bytes = downloaded if photo.file_unique_id == original.file_unique_id else await download_photo(context, original)
+            return await services.upload_image(lambda: google.drive, GOOGLE_DRIVE_FOLDER_ID, image_filename, original_bytes)
+        upload_task = asyncio.create_task(archive_original())
+        try:
+            entry, text = await services.analyze_image(image_bytes)
+        except Exception:
+            await asyncio.gather(upload_task, return_exceptions=True)
+            raise
+        drive_note = "_Image is being saved to Google Drive._"
     elapsed = time.time() - start_time
     entry.time_elapsed = elapsed
-    reply = f"*Analysis Report*\n{text}\n\n_Image uploaded to Google Drive._\n\n_Analysis time: {elapsed:.2f} seconds_"
+    reply = f"*Analysis Report*\n{text}\n\n{drive_note}\n\n_Analysis time: {elapsed:.2f} seconds_"
+    if len(reply) > MAX_TELEGRAM_MSG_LENGTH:
+        reply = reply[:MAX_TELEGRAM_MSG_LENGTH]
+    await clients.telegram.post(
+        "sendMessage",
+        json={
+            "chat_id": update.effective_chat.id,
+            "text": reply,
+            "parse_mode": "Markdown"
+        }
+    )
+    if upload_task is not None:
+        # Join the Drive upload into the meal entry once the reply is out
+        drive_file_id = None
+        try:
+            drive_file_id = await upload_task
+            entry.image_url = f"https://drive.google.com/uc?id={drive_file_id}"
+        except Exception as e:
+            print(f"Error uploading image to Google Drive: {e}")
+        if entry.food:
+            # A failed analysis must not be served for this photo, or anything like it, again
+            await services.run_blocking("images", image_cache.store, image_bytes, entry, text, drive_file_id,
+                                        file_unique_id=original.file_unique_id)
     # Log to Meal Tracker sheet
-    GoogleSheetsModule.log_meal_tracker(
-        sheets_service, GOOGLE_SHEET_ID,
-        username, entry.food, entry.calories, entry.proteins, entry.carbs, entry.fat, entry.image_url, entry.time_elapsed
+    user_id = update.effective_user.id if update.effective_user else 0
+    sheet_logger.log_meal_tracker(
+        username, entry.food, entry.calories, entry.proteins, entry.carbs, entry.fat, entry.image_url, entry.time_elapsed, user_id
     )
+    await services.run_blocking("storage", nutrition.add_meals, user_id, [entry])
+
+# Handler for albums (media groups) collected by album_batcher
+async def handle_album(items):
+    update, context = items[0]
     if update.effective_user:
         first_name = update.effective_user.first_name or ""
         last_name = update.effective_user.last_name or ""
         username = (first_name + " " + last_name).strip() if (first_name or last_name) else str(update.effective_user.id)
     else:
         username = "Unknown"
-    if len(reply) > MAX_TELEGRAM_MSG_LENGTH:
-        reply = reply[:MAX_TELEGRAM_MSG_LENGTH]
-    async with httpx.AsyncClient() as client:
-        await client.post(
-            f"https://api.telegram.org/bot{TELEGRAM_TOKEN}/sendMessage",
+    photos = [(item_update.message.photo[-1], choose_photo_size(item_update.message.photo, ANALYSIS_MAX_SIDE))
+              for item_update, _ in items]
+    with metrics.span("download"):
+        downloads = await asyncio.gather(*(download_photo(context, photo) for _, photo in photos))
+    images = await asyncio.gather(*(services.run_blocking("images", prepare_for_analysis, image, ANALYSIS_MAX_SIDE, ANALYSIS_JPEG_QUALITY)
+                                    for image in downloads))
+
+    from datetime import datetime
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+
+    async def archive_original(index):
+        original, photo = photos[index]
+        original_bytes = downloads[index] if photo.file_unique_id == original.file_unique_id else await download_photo(context, original)
+        return await services.upload_image(lambda: google.drive, GOOGLE_DRIVE_FOLDER_ID, f"{username}_{timestamp}_{index + 1}.jpg", original_bytes)
+    upload_task = asyncio.gather(*(archive_original(i) for i in range(len(photos))), return_exceptions=True)
+
+    import time
+    start_time = time.time()
+    try:
+        results = await services.analyze_images(images)
+    except Exception:
+        await upload_task
+        raise
+    elapsed = time.time() - start_time
+
+    sections = []
+    total_calories = 0
+    for i, (entry, text) in enumerate(results, start=1):
+        entry.time_elapsed = elapsed
+        sections.append(f"*Item {i}*\n{text}")
+        total_calories += entry.calories or 0
+    reply = "*Meal Analysis Report*\n\n" + "\n\n".join(sections)
+    if total_calories:
+        reply += f"\n\n*Total Calories:* {total_calories:g} kcal"
+    reply += f"\n\n_Images are being saved to Google Drive._\n\n_Analysis time: {elapsed:.2f} seconds_"
+    for part in split_markdown(reply):
+        await clients.telegram.post(
+            "sendMessage",
             json={
                 "chat_id": update.effective_chat.id,
-                "text": reply,
+                "text": part,
                 "parse_mode": "Markdown"
             }
         )
 
+    for (entry, _), drive_file_id in zip(results, await upload_task):
+        if isinstance(drive_file_id, Exception):
+            print(f"Error uploading image to Google Drive: {drive_file_id}")
+        else:
+            entry.image_url = f"https://drive.google.com/uc?id={drive_file_id}"
+    entries = [entry for entry, _ in results]
+    user_id = update.effective_user.id if update.effective_user else 0
+    sheet_logger.log_meals(username, entries, user_id)
+    await services.run_blocking("storage", nutrition.add_meals, user_id, entries)
+
+album_batcher = AlbumBatcher(handle_album, window=float(os.getenv("ALBUM_WINDOW_SECONDS", "1.0")))
+
 application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_text))
 application.add_handler(MessageHandler(filters.PHOTO, handle_photo))
 
+_init_lock = asyncio.Lock()
+_initialized = False
+
+async def ensure_initialized():
+    # application.initialize() runs once per process, not once per update
+    global _initialized
+    if _initialized:
+        return
+    async with _init_lock:
+        if not _initialized:
+            await application.initialize()
+            _initialized = True
+
+async def process_update(data):
+    update = Update.de_json(data, application.bot)
+    await ensure_initialized()
+    await application.process_update(update)
+
+# WEBHOOK_QUEUE=memory|sqlite acknowledges updates right away and processes them in workers
+update_queue = None
+if WEBHOOK_QUEUE in ("memory", "sqlite"):
+    update_queue = UpdateQueue(
+        process_update,
+        workers=int(os.getenv("WEBHOOK_WORKERS", "8")),
+        max_pending=int(os.getenv("WEBHOOK_MAX_PENDING", "1000")),
+        store=SQLiteUpdateStore(os.getenv("WEBHOOK_QUEUE_PATH", "/tmp/update_queue.sqlite3")) if WEBHOOK_QUEUE == "sqlite" else None
+    )
+
 @app.post("/webhook")
 async def telegram_webhook(request: Request):
     data = await request.json()
+    if update_queue is None:
+        await process_update(data)
+        return {"ok": True}
+    if not isinstance(data.get("update_id"), int):
+        raise HTTPException(status_code=400, detail="Missing update_id")
     update = Update.de_json(data, application.bot)
-    await application.initialize()
-    await application.process_update(update)
+    chat_id = update.effective_chat.id if update.effective_chat else 0
+    try:
+        update_queue.submit(update.update_id, chat_id, data)
+    except QueueFull:
+        # Telegram retries non-2xx responses later
+        raise HTTPException(status_code=503, detail="Update queue is full")
     return {"ok": True}
 
+def check_admin(request: Request):
+    if not ADMIN_TOKEN or request.headers.get("X-Admin-Token") != ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Forbidden")
+
+@app.get("/admin/queue")
+async def queue_stats(request: Request):
+    check_admin(request)
+    return update_queue.stats() if update_queue else {"enabled": False}
+
+@app.get("/admin/response-cache")
+async def response_cache_stats(request: Request):
+    check_admin(request)
+    return response_cache.stats() if response_cache else {"enabled": False}
+
+@app.post("/admin/response-cache/invalidate")
+async def invalidate_response_cache(request: Request):
+    # Call after changing business_tools offers or plans; an empty body clears everything
+    check_admin(request)
+    body = await request.json() if await request.body() else {}
+    removed = response_cache.invalidate(body.get("partition"), body.get("query")) if response_cache else 0
+    tool_dispatcher.clear_memo()
+    return {"removed": removed}
+
+@app.post("/admin/nutrition/rebuild")
+async def rebuild_nutrition(request: Request):
+    # Recomputes all totals from the "Meal Tracker" sheet, e.g. after a cold start on a fresh disk
+    check_admin(request)
+    def read_sheet():
+        sheet_logger.flush()  # spooled meals would otherwise be missing from the read
+        return guards["sheets"].call_sync(GoogleSheetsModule.read_rows, google.sheets, GOOGLE_SHEET_ID, MEAL_TRACKER_TAB)
+    rows = await services.run_blocking("sheets", read_sheet)
+    return {"meals": await services.run_blocking("storage", nutrition.rebuild, rows)}
+
+@app.middleware("http")
+async def profile_request(request: Request, call_next):
+    # X-Profile: <ADMIN_TOKEN> samples the event loop while this request runs and logs the hottest frames
+    if not ADMIN_TOKEN or request.headers.get("X-Profile") != ADMIN_TOKEN:
+        return await call_next(request)
+    with SamplingProfiler() as profiler:
+        response = await call_next(request)
+    print(f"Profile for {request.method} {request.url.path}:\n{profiler.report()}")
+    return response
+
+metrics.gauge("bot_update_queue_depth", lambda: {(): update_queue.stats()["depth"]} if update_queue else {})
+metrics.gauge("bot_update_queue_lag_seconds", lambda: {(): update_queue.stats()["lag_seconds"]} if update_queue else {})
+metrics.gauge("bot_upstream_retries", lambda: {(("upstream", name),): guard.retries for name, guard in guards.items()})
+metrics.gauge("bot_upstream_circuit_open", lambda: {
+    (("upstream", name),): int(guard.breaker.state != "closed") for name, guard in guards.items()
+})
+metrics.gauge("bot_response_cache_hit_rate", lambda: {(): response_cache.stats()["hit_rate"]} if response_cache else {})
+metrics.gauge("bot_context_summaries", lambda: {(): context_window.stats()["summaries"]})
+
+@app.get("/metrics")
+def prometheus_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
 @app.get("/")
 def root():
     return {"message": "Telegram Gemini Chatbot is running on Vercel."}
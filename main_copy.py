@@ -5,6 +5,7 @@ from telegram.ext import Application, MessageHandler, ContextTypes, filters
 import google.generativeai as genai
 import asyncio
 from business_tools import get_current_offers, get_diet_plans, place_order
+from classifier import default_classifier
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -20,12 +21,12 @@ MAX_TELEGRAM_MSG_LENGTH = 4096
 async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_text = update.message.text
     system_prompt = "You are a helpful assistant. Greet the user initially and respond to the user's query in a crisp and concise manner."
-    user_text_lower = user_text.lower()
-    if "offer" in user_text_lower or "plan" in user_text_lower:
+    categories = default_classifier().classify(user_text)
+    if "offers" in categories:
         reply = get_current_offers()
-    elif "diet" in user_text_lower:
+    elif "diet" in categories:
         reply = get_diet_plans()
-    elif "order" in user_text_lower:
+    elif "order" in categories:
         reply = place_order(user_text)
     else:
         contents = [
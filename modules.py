@@ -1,32 +1,64 @@
 import os
+import json
+from typing import Optional
 from pydantic import BaseModel
 from datetime import datetime
 class MealTrackerEntry(BaseModel):
     date: str
     time: str
     food: str
-    calories: str
-    proteins: str
-    carbs: str
-    fat: str
+    calories: Optional[float] = None
+    proteins: Optional[float] = None
+    carbs: Optional[float] = None
+    fat: Optional[float] = None
     image_url: str
     time_elapsed: float
-import google.generativeai as genai
+
+NUTRIENT_FIELDS = ("calories", "proteins", "carbs", "fat")
+
+# Gemini response schemas for structured meal analysis
+MEAL_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "food": {"type": "string"},
+        "calories": {"type": "number"},
+        "proteins": {"type": "number"},
+        "carbs": {"type": "number"},
+        "fat": {"type": "number"}
+    },
+    "required": ["food", "calories", "proteins", "carbs", "fat"]
+}
+ALBUM_SCHEMA = {
+    "type": "object",
+    "properties": {"items": {"type": "array", "items": MEAL_SCHEMA}},
+    "required": ["items"]
+}
 from telegram import Update
 from telegram.ext import ContextTypes
 
 image_prompt = '''
-    You are an expert nutrition assistant. Analyze the food item in the image and respond clearly in this exact format using bold and italics:
+    You are an expert nutrition assistant. Analyze the food item in the image and return JSON with:
 
-    Food: <name of food item>
-    Calories: <calories in kcal>
-    Proteins: <protein in grams>
-    Carbs: <carbs in grams>
-    Fat: <fat in grams>
+    food: name of the food item
+    calories: calories in kcal
+    proteins: protein in grams
+    carbs: carbs in grams
+    fat: fat in grams
+
+    Use plain numbers without units. If you cannot analyze the image, return an empty food name and zeros.
+'''
 
-    Do NOT include any additional text or commentary.
+album_prompt = '''
+    You are an expert nutrition assistant. You are given {count} images of one meal, numbered in order from 1 to {count}.
+    Return JSON with an "items" list holding exactly one entry per image, in the same order, each with:
 
-    If you cannot analyze the image, reply: "Sorry, I couldn't analyze that."
+    food: name of the food item
+    calories: calories in kcal
+    proteins: protein in grams
+    carbs: carbs in grams
+    fat: fat in grams
+
+    Use plain numbers without units. If you cannot analyze an image, give it an empty food name and zeros.
 '''
 
 text_prompt = '''
@@ -37,6 +69,24 @@ text_prompt = '''
     Use numbering for lists where applicable.
 '''
 
+summary_prompt = '''
+    Update the running summary of a conversation between a user and a nutrition assistant.
+    Keep what matters for later replies: the user's goals, diet, preferences, allergies, plans or orders discussed and open questions.
+    Drop greetings and small talk. Reply with the updated summary only, in at most {max_words} words.
+'''
+
+GEMINI_MODEL = "models/gemini-2.5-flash"
+NO_RESPONSE = "Sorry, I couldn't generate a response."
+BLOCKED_RESPONSE = "Sorry, I can't assist with that."
+
+def gemini_model(gemini_api_key, model=None, system_instruction=None):
+    # Use the shared model when one is passed in; otherwise build one for this call
+    if model is not None:
+        return model
+    import google.generativeai as genai  # imported on first use to keep cold starts fast
+    genai.configure(api_key=gemini_api_key)
+    return genai.GenerativeModel(GEMINI_MODEL, system_instruction=system_instruction)
+
 class WelcomeModule:
     @staticmethod
     def welcome_message():
@@ -44,114 +94,222 @@ class WelcomeModule:
 
 class ConversationModule:
     @staticmethod
-    def get_response(user_text, gemini_api_key):
+    def is_blocked(user_text):
         # Guard rails: block harmful, sexual, or offensive messages
-        import re
-        block_patterns = [
-            r"sex|sexual|porn|nude|naked|violence|kill|murder|hate|racist|abuse|offensive|suicide|self[- ]?harm|terror|bomb|drugs|weapon|assault|molest|rape|harass|bully|exploit|gore|blood|torture|explicit|obscene|curse|swear|profanity|slur"
-        ]
-        if any(re.search(pat, user_text, re.IGNORECASE) for pat in block_patterns):
-            return "Sorry, I can't assist with that."
-        genai.configure(api_key=gemini_api_key)
-        model = genai.GenerativeModel("models/gemini-2.5-flash")
+        from classifier import default_classifier
+        return "blocked" in default_classifier().classify(user_text)
+
+    @staticmethod
+    def build_contents(user_text):
         # system_prompt = (
         #     "You are a helpful assistant. Respond to the user's query in a crisp and concise manner."
         #     "Use double asterisks for bold and single underscores for italics as per Telegram Markdown formatting."
         #     "Use proper formatting for lists and line breaks."
         #     "Strictly refuse to answer any harmful, sexual, violent, or offensive requests. If the user asks anything inappropriate, reply: 'Sorry, I can't assist with that.'"
         # )
-        contents = [
-            {"role": "model", "parts": [{"text": text_prompt}]},
+        # text_prompt goes in as the model's system instruction, not as a conversation turn
+        return [
             {"role": "user", "parts": [{"text": user_text}]}
         ]
-        response = model.generate_content(contents)
-        return response.candidates[0].content.parts[0].text if response.candidates else "Sorry, I couldn't generate a response."
+
+    @staticmethod
+    def get_response(user_text, gemini_api_key, model=None):
+        if ConversationModule.is_blocked(user_text):
+            return BLOCKED_RESPONSE
+        model = gemini_model(gemini_api_key, model, system_instruction=text_prompt)
+        response = model.generate_content(ConversationModule.build_contents(user_text))
+        return response.candidates[0].content.parts[0].text if response.candidates else NO_RESPONSE
+
+    @staticmethod
+    async def get_response_async(user_text, gemini_api_key, model=None):
+        # Same as get_response, but uses the native async Gemini client
+        if ConversationModule.is_blocked(user_text):
+            return BLOCKED_RESPONSE
+        model = gemini_model(gemini_api_key, model, system_instruction=text_prompt)
+        response = await model.generate_content_async(ConversationModule.build_contents(user_text))
+        return response.candidates[0].content.parts[0].text if response.candidates else NO_RESPONSE
+
+    @staticmethod
+    async def stream_response_async(user_text, gemini_api_key, model=None):
+        # Yields the reply text chunk by chunk as Gemini generates it
+        if ConversationModule.is_blocked(user_text):
+            yield BLOCKED_RESPONSE
+            return
+        model = gemini_model(gemini_api_key, model, system_instruction=text_prompt)
+        response = await model.generate_content_async(ConversationModule.build_contents(user_text), stream=True)
+        async for chunk in response:
+            if chunk.candidates and chunk.candidates[0].content.parts:
+                yield chunk.candidates[0].content.parts[0].text
+
+    @staticmethod
+    async def summarize_async(summary, turns, gemini_api_key, model=None, max_words=150):
+        # Folds `turns` (user text, reply pairs) into the running `summary`
+        model = gemini_model(gemini_api_key, model)
+        exchanges = "".join(f"User: {user_text}\nBot: {reply}\n" for user_text, reply in turns)
+        prompt = (summary_prompt.format(max_words=max_words)
+                  + f"\nCurrent summary:\n{summary or '(none)'}\n\nNew exchanges:\n{exchanges}")
+        response = await model.generate_content_async([{"role": "user", "parts": [{"text": prompt}]}])
+        return response.candidates[0].content.parts[0].text if response.candidates else summary
 
 class ImageCalorieModule:
     @staticmethod
-    def analyze_image(image_bytes, gemini_api_key, image_url=None, time_elapsed=None):
-        genai.configure(api_key=gemini_api_key)
-        model = genai.GenerativeModel("models/gemini-2.5-flash")
-        prompt = (
-            "You are a nutrition expert. Analyze the food item in this image and reply in the following format, using double asterisks for bold (Telegram markdown):\n"
-            "**Food:** <food>\n**Calories:** <calories>\n**Proteins:** <proteins>\n**Carbs:** <carbs>\n**Fat:** <fat>\n"
-            "Keep the response crisp and concise."
-        )
-        contents = [
+    def build_contents(image_bytes):
+        return [
             {"role": "user", "parts": [
                 {"text": image_prompt},
                 {"inline_data": {"mime_type": "image/jpeg", "data": image_bytes}}
             ]}
         ]
-        response = model.generate_content(contents)
-        text = response.candidates[0].content.parts[0].text if response.candidates else "Sorry, I couldn't analyze the image."
+
+    @staticmethod
+    def generation_config(schema):
+        # Ask Gemini for JSON matching `schema` instead of free text
+        return {"response_mime_type": "application/json", "response_schema": schema}
+
+    @staticmethod
+    def decode_meal(data):
+        # Fast path for structured output: a dict with a food name and numeric nutrients, else None
+        if not isinstance(data, dict) or not isinstance(data.get("food"), str):
+            return None
+        meal = {"food": data["food"].strip()}
+        for field in NUTRIENT_FIELDS:
+            value = data.get(field)
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                return None
+            meal[field] = float(value)
+        return meal
+
+    @staticmethod
+    def scrape_meal(text):
+        # Fallback for free-text replies: "Food: ..." lines, with or without Markdown bold
         import re
-        food = calories = proteins = carbs = fat = ""
-        food_match = re.search(r"\*\*Food:\*\*\s*(.*)", text)
-        calories_match = re.search(r"\*\*Calories:\*\*\s*(\d+)", text)
-        proteins_match = re.search(r"\*\*Proteins:\*\*\s*(\d+)", text)
-        carbs_match = re.search(r"\*\*Carbs:\*\*\s*(\d+)", text)
-        fat_match = re.search(r"\*\*Fat:\*\*\s*(\d+)", text)
+        meal = {"food": ""}
+        food_match = re.search(r"\**Food:\**\s*(.*)", text, re.IGNORECASE)
         if food_match:
-            food = food_match.group(1)
-        if calories_match:
-            calories = calories_match.group(1)
-        if proteins_match:
-            proteins = proteins_match.group(1)
-        if carbs_match:
-            carbs = carbs_match.group(1)
-        if fat_match:
-            fat = fat_match.group(1)
+            meal["food"] = food_match.group(1).strip(" *")
+        for field in NUTRIENT_FIELDS:
+            match = re.search(rf"\**{field}:\**\s*([\d.]+)", text, re.IGNORECASE)
+            meal[field] = float(match.group(1)) if match else None
+        return meal
+
+    @staticmethod
+    def parse_meal(text):
+        try:
+            meal = ImageCalorieModule.decode_meal(json.loads(text))
+        except ValueError:
+            meal = None
+        return meal if meal is not None else ImageCalorieModule.scrape_meal(text)
+
+    @staticmethod
+    def parse_response(text, image_url=None, time_elapsed=None):
+        return ImageCalorieModule.make_entry(ImageCalorieModule.parse_meal(text), image_url, time_elapsed)
+
+    @staticmethod
+    def make_entry(meal, image_url=None, time_elapsed=None):
         now = datetime.now()
-        entry = MealTrackerEntry(
+        return MealTrackerEntry(
             date=now.strftime('%Y-%m-%d'),
             time=now.strftime('%H:%M:%S'),
-            food=food,
-            calories=calories,
-            proteins=proteins,
-            carbs=carbs,
-            fat=fat,
             image_url=image_url or "",
-            time_elapsed=time_elapsed if time_elapsed is not None else 0.0
+            time_elapsed=time_elapsed if time_elapsed is not None else 0.0,
+            **meal
+        )
+
+    @staticmethod
+    def render_markdown(entry):
+        # Telegram Markdown report built from the structured fields
+        if not entry.food:
+            return "Sorry, I couldn't analyze that."
+        def amount(value, unit):
+            return f"{value:g} {unit}" if value is not None else "n/a"
+        return (
+            f"*Food:* {entry.food}\n"
+            f"*Calories:* {amount(entry.calories, 'kcal')}\n"
+            f"*Proteins:* {amount(entry.proteins, 'g')}\n"
+            f"*Carbs:* {amount(entry.carbs, 'g')}\n"
+            f"*Fat:* {amount(entry.fat, 'g')}"
         )
-        return entry, text
+
+    @staticmethod
+    def analyze_image(image_bytes, gemini_api_key, image_url=None, time_elapsed=None, model=None):
+        model = gemini_model(gemini_api_key, model)
+        response = model.generate_content(ImageCalorieModule.build_contents(image_bytes),
+                                          generation_config=ImageCalorieModule.generation_config(MEAL_SCHEMA))
+        text = response.candidates[0].content.parts[0].text if response.candidates else ""
+        entry = ImageCalorieModule.parse_response(text, image_url, time_elapsed)
+        return entry, ImageCalorieModule.render_markdown(entry)
+
+    @staticmethod
+    async def analyze_image_async(image_bytes, gemini_api_key, image_url=None, time_elapsed=None, model=None):
+        # Same as analyze_image, but uses the native async Gemini client
+        model = gemini_model(gemini_api_key, model)
+        response = await model.generate_content_async(ImageCalorieModule.build_contents(image_bytes),
+                                                      generation_config=ImageCalorieModule.generation_config(MEAL_SCHEMA))
+        text = response.candidates[0].content.parts[0].text if response.candidates else ""
+        entry = ImageCalorieModule.parse_response(text, image_url, time_elapsed)
+        return entry, ImageCalorieModule.render_markdown(entry)
+
+    @staticmethod
+    def build_album_contents(images):
+        parts = [{"text": album_prompt.format(count=len(images))}]
+        for image_bytes in images:
+            parts.append({"inline_data": {"mime_type": "image/jpeg", "data": image_bytes}})
+        return [{"role": "user", "parts": parts}]
+
+    @staticmethod
+    def parse_album_response(text, count):
+        # One meal dict per image, in order; items that are missing or malformed come back empty
+        try:
+            items = json.loads(text).get("items", [])
+        except (ValueError, AttributeError):
+            items = []
+        meals = []
+        for i in range(count):
+            meal = ImageCalorieModule.decode_meal(items[i]) if i < len(items) else None
+            meals.append(meal or {"food": ""})
+        return meals
+
+    @staticmethod
+    async def analyze_images_async(images, gemini_api_key, model=None):
+        # Analyzes all photos of an album in one request; returns [(entry, text)] in input order
+        model = gemini_model(gemini_api_key, model)
+        response = await model.generate_content_async(ImageCalorieModule.build_album_contents(images),
+                                                      generation_config=ImageCalorieModule.generation_config(ALBUM_SCHEMA))
+        text = response.candidates[0].content.parts[0].text if response.candidates else ""
+        results = []
+        for meal in ImageCalorieModule.parse_album_response(text, len(images)):
+            entry = ImageCalorieModule.make_entry(meal)
+            results.append((entry, ImageCalorieModule.render_markdown(entry)))
+        return results
 
 class GoogleSheetsModule:
     @staticmethod
-    def log_chat_history(service, spreadsheet_id, username, user_query, bot_message):
-        from datetime import datetime
-        now = datetime.now()
-        # Get current number of rows for auto-incremental ID
-        sheet = service.spreadsheets()
-        result = sheet.values().get(spreadsheetId=spreadsheet_id, range="Chat History!B2:B").execute()
-        values = result.get('values', [])
-        next_id = len(values) + 1
-        row = [next_id, now.strftime('%Y-%m-%d'), now.strftime('%H:%M:%S'), username, user_query, bot_message]
-        sheet.values().append(
-            spreadsheetId=spreadsheet_id,
-            range="Chat History!B1",
-            valueInputOption="RAW",
-            body={"values": [row]}
-        ).execute()
+    def count_rows(service, spreadsheet_id, tab):
+        # Number of logged rows in a tab (column B holds the row ID)
+        result = service.spreadsheets().values().get(spreadsheetId=spreadsheet_id, range=f"{tab}!B2:B").execute()
+        return len(result.get('values', []))
 
     @staticmethod
-    def log_meal_tracker(service, spreadsheet_id, client, food, calories, proteins, carbs, fat, picture_url, time_elapsed):
-        from datetime import datetime
-        now = datetime.now()
-        # Get current number of rows for auto-incremental ID
-        sheet = service.spreadsheets()
-        result = sheet.values().get(spreadsheetId=spreadsheet_id, range="Meal Tracker!B2:B").execute()
-        values = result.get('values', [])
-        next_id = len(values) + 1
-        row = [next_id, now.strftime('%Y-%m-%d'), now.strftime('%H:%M:%S'), client, food, calories, proteins, carbs, fat, picture_url, time_elapsed]
-        sheet.values().append(
+    def read_rows(service, spreadsheet_id, tab):
+        # Every logged row of a tab in one request, without the row ID column
+        result = service.spreadsheets().values().get(spreadsheetId=spreadsheet_id, range=f"{tab}!C2:M").execute()
+        return result.get('values', [])
+
+    @staticmethod
+    def append_rows(service, spreadsheet_id, tab, rows):
+        # Append many rows to a tab in a single request
+        service.spreadsheets().values().append(
             spreadsheetId=spreadsheet_id,
-            range="Meal Tracker!B1",
+            range=f"{tab}!B1",
             valueInputOption="RAW",
-            body={"values": [row]}
+            body={"values": rows}
         ).execute()
 
 class GoogleDriveModule:
+    # Photos above this size are sent as a resumable, chunked upload
+    RESUMABLE_THRESHOLD = 5 * 1024 * 1024
+    CHUNK_SIZE = 1024 * 1024
+
     @staticmethod
     def upload_image(service, folder_id, file_name, image_bytes):
         from googleapiclient.http import MediaIoBaseUpload
@@ -160,6 +318,14 @@ class GoogleDriveModule:
             'name': file_name,
             'parents': [folder_id]
         }
-        media = MediaIoBaseUpload(io.BytesIO(image_bytes), mimetype='image/jpeg')
-        file = service.files().create(body=file_metadata, media_body=media, fields='id').execute()
+        if len(image_bytes) <= GoogleDriveModule.RESUMABLE_THRESHOLD:
+            media = MediaIoBaseUpload(io.BytesIO(image_bytes), mimetype='image/jpeg')
+            file = service.files().create(body=file_metadata, media_body=media, fields='id').execute()
+            return file.get('id')
+        media = MediaIoBaseUpload(io.BytesIO(image_bytes), mimetype='image/jpeg',
+                                  chunksize=GoogleDriveModule.CHUNK_SIZE, resumable=True)
+        request = service.files().create(body=file_metadata, media_body=media, fields='id')
+        file = None
+        while file is None:
+            _, file = request.next_chunk(num_retries=3)
         return file.get('id')
@@ -0,0 +1,113 @@
+import sqlite3
+import threading
+from datetime import date, datetime, timedelta
+from modules import NUTRIENT_FIELDS
+
+# "Meal Tracker" columns after the row ID: date, time, client name, food, the nutrients, picture URL,
+# analysis time and the Telegram user ID
+SHEET_DATE, SHEET_FOOD, SHEET_NUTRIENTS, SHEET_USER_ID = 0, 3, 4, 10
+
+
+def week_of(day):
+    # ISO weeks start on Monday; a week is keyed by its Monday's date
+    return (day - timedelta(days=day.weekday())).isoformat()
+
+
+def _number(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+class NutritionTotals:
+    """Running calorie and macro totals per client, per day and per ISO week.
+
+    Each logged meal adds to one daily and one weekly row, so a summary is a
+    primary-key lookup no matter how many meals were logged. Clients are keyed
+    by Telegram user ID (display names are not unique), which is also written
+    to the "Meal Tracker" sheet so `rebuild` can recompute everything from one
+    bulk read of it. All methods block on SQLite; call them off the event loop.
+    """
+
+    def __init__(self, path=None):
+        self._db = sqlite3.connect(path or ":memory:", check_same_thread=False)
+        self._lock = threading.Lock()
+        columns = ", ".join(f"{field} REAL NOT NULL DEFAULT 0" for field in NUTRIENT_FIELDS)
+        for table, period in (("daily_totals", "day"), ("weekly_totals", "week")):
+            self._db.execute(
+                f"CREATE TABLE IF NOT EXISTS {table} (client TEXT, {period} TEXT, meals INTEGER NOT NULL DEFAULT 0, "
+                f"{columns}, PRIMARY KEY (client, {period})) WITHOUT ROWID"
+            )
+        self._db.commit()
+
+    def _add(self, user_id, day, amounts):
+        values = [amounts.get(field) or 0.0 for field in NUTRIENT_FIELDS]
+        updates = ", ".join(f"{field} = {field} + excluded.{field}" for field in NUTRIENT_FIELDS)
+        for table, period, key in (("daily_totals", "day", day.isoformat()), ("weekly_totals", "week", week_of(day))):
+            self._db.execute(
+                f"INSERT INTO {table} (client, {period}, meals, {', '.join(NUTRIENT_FIELDS)}) VALUES (?, ?, 1, {', '.join('?' * len(NUTRIENT_FIELDS))}) "
+                f"ON CONFLICT (client, {period}) DO UPDATE SET meals = meals + 1, {updates}",
+                [str(user_id), key] + values
+            )
+
+    def add_meals(self, user_id, entries):
+        # Called next to SheetLogger.log_meal_tracker / log_meals with the same entries
+        with self._lock:
+            for entry in entries:
+                if not entry.food:
+                    continue  # failed analyses are logged to the sheet but carry no nutrients
+                day = datetime.strptime(entry.date, '%Y-%m-%d').date()
+                self._add(user_id, day, {field: getattr(entry, field) for field in NUTRIENT_FIELDS})
+            self._db.commit()
+
+    def rebuild(self, rows):
+        """Replaces all totals with ones computed from "Meal Tracker" rows
+        (as returned by GoogleSheetsModule.read_rows). Returns the number of
+        meals counted."""
+        count = 0
+        with self._lock:
+            self._db.execute("DELETE FROM daily_totals")
+            self._db.execute("DELETE FROM weekly_totals")
+            for row in rows:
+                if len(row) <= SHEET_USER_ID or not row[SHEET_USER_ID] or not row[SHEET_FOOD]:
+                    continue  # logged before user IDs were recorded, or a failed analysis (no food)
+                try:
+                    day = datetime.strptime(row[SHEET_DATE], '%Y-%m-%d').date()
+                except (TypeError, ValueError):
+                    continue  # header or hand-edited row
+                nutrients = row[SHEET_NUTRIENTS:SHEET_NUTRIENTS + len(NUTRIENT_FIELDS)]
+                self._add(row[SHEET_USER_ID], day, {field: _number(value) for field, value in zip(NUTRIENT_FIELDS, nutrients)})
+                count += 1
+            self._db.commit()
+        return count
+
+    def _totals(self, table, period, user_id, key):
+        with self._lock:
+            row = self._db.execute(
+                f"SELECT meals, {', '.join(NUTRIENT_FIELDS)} FROM {table} WHERE client = ? AND {period} = ?",
+                (str(user_id), key)
+            ).fetchone()
+        totals = dict(zip(("meals",) + NUTRIENT_FIELDS, row or (0,) + (0.0,) * len(NUTRIENT_FIELDS)))
+        totals[period] = key
+        return totals
+
+    def day(self, user_id, day=None):
+        return self._totals("daily_totals", "day", user_id, (day or date.today()).isoformat())
+
+    def week(self, user_id, day=None):
+        return self._totals("weekly_totals", "week", user_id, week_of(day or date.today()))
+
+    def summary(self, user_id, period="day", day=None):
+        # Telegram Markdown reply for "how much have I eaten today / this week"
+        totals = self.week(user_id, day) if period == "week" else self.day(user_id, day)
+        label = "this week" if period == "week" else "today"
+        if not totals["meals"]:
+            return f"You haven't logged any meals {label} yet. Send me a photo of your food to start tracking."
+        return (
+            f"*Your nutrition {label}* ({totals['meals']} meal{'s' if totals['meals'] != 1 else ''})\n"
+            f"*Calories:* {totals['calories']:.0f} kcal\n"
+            f"*Proteins:* {totals['proteins']:.1f} g\n"
+            f"*Carbs:* {totals['carbs']:.1f} g\n"
+            f"*Fat:* {totals['fat']:.1f} g"
+        )
@@ -0,0 +1,250 @@
+import asyncio
+import random
+import threading
+import time
+from collections import OrderedDict
+from metrics import metrics
+
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+
+class CircuitOpen(Exception):
+    pass
+
+
+class TokenBucket:
+    """`rate` tokens per second, up to `burst`. Thread-safe; `reserve` returns
+    how long the caller must wait for its token."""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+
+class CircuitBreaker:
+    """Opens after `failure_threshold` consecutive failures and fails fast for
+    `reset_timeout` seconds, then lets one trial call through (half-open)."""
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self._opened is None:
+            return "closed"
+        return "half-open" if time.monotonic() - self._opened >= self.reset_timeout else "open"
+
+    def before_call(self, name):
+        # Returns True when this call is the half-open trial
+        with self._lock:
+            state = self.state
+            if state == "open" or (state == "half-open" and self._trial):
+                raise CircuitOpen(f"{name} is unavailable, failing fast")
+            if state == "half-open":
+                self._trial = True
+                return True
+            return False
+
+    def abandon(self, trial):
+        # A cancelled trial proves nothing either way; let the next call try instead
+        if trial:
+            with self._lock:
+                self._trial = False
+
+    def record(self, ok):
+        with self._lock:
+            self._trial = False
+            if ok:
+                self._failures = 0
+                self._opened = None
+                return
+            self._failures += 1
+            if self._failures >= self.failure_threshold:
+                self._opened = time.monotonic()
+
+
+def status_of(error):
+    # HTTP status from googleapiclient HttpError, google.api_core errors or httpx responses
+    resp = getattr(error, "resp", None)
+    if resp is not None and getattr(resp, "status", None):
+        return int(resp.status)
+    code = getattr(error, "code", None)
+    if isinstance(code, int):
+        return code
+    response = getattr(error, "response", None)
+    return getattr(response, "status_code", None)
+
+
+def retry_after_of(error):
+    value = getattr(error, "retry_after", None)
+    resp = getattr(error, "resp", None)
+    if value is None and hasattr(resp, "get"):
+        value = resp.get("retry-after")  # googleapiclient HttpError headers
+    response = getattr(error, "response", None)
+    if value is None and response is not None:
+        value = response.headers.get("retry-after")
+    try:
+        return float(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def is_retryable(error):
+    if isinstance(error, (asyncio.TimeoutError, TimeoutError, ConnectionError)):
+        return True
+    return status_of(error) in RETRYABLE_STATUS
+
+
+class UpstreamGuard:
+    """Rate limit, retry and circuit breaker for one upstream.
+
+    Calls take a token from the upstream's bucket (and from the chat's bucket
+    when `chat_id` is given), are retried on 429/5xx/timeouts with exponential
+    backoff plus full jitter, or the server's Retry-After when it sends one,
+    and fail fast with CircuitOpen while the upstream looks down.
+    """
+
+    def __init__(self, name, rate, burst, per_chat_rate=None, per_chat_burst=1,
+                 max_retries=3, base_delay=0.5, max_delay=30.0, breaker=None, max_chats=10000):
+        self.name = name
+        self.bucket = TokenBucket(rate, burst)
+        self.per_chat_rate = per_chat_rate
+        self.per_chat_burst = per_chat_burst
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.breaker = breaker or CircuitBreaker()
+        self.max_chats = max_chats
+        self._chat_buckets = OrderedDict()
+        self._chat_lock = threading.Lock()
+        self.retries = 0
+        self.throttled = 0
+
+    def _wait_for_tokens(self, chat_id):
+        wait = self.bucket.reserve()
+        if chat_id is not None and self.per_chat_rate:
+            with self._chat_lock:
+                bucket = self._chat_buckets.pop(chat_id, None) or TokenBucket(self.per_chat_rate, self.per_chat_burst)
+                self._chat_buckets[chat_id] = bucket
+                if len(self._chat_buckets) > self.max_chats:
+                    self._chat_buckets.popitem(last=False)
+            wait = max(wait, bucket.reserve())
+        if wait > 0:
+            self.throttled += 1
+        return wait
+
+    def backoff(self, attempt, retry_after=None):
+        if retry_after is not None:
+            return min(retry_after, self.max_delay)
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    async def acquire(self, chat_id=None):
+        # Returns whether this call is the breaker's half-open trial
+        trial = self.breaker.before_call(self.name)
+        wait = self._wait_for_tokens(chat_id)
+        if wait > 0:
+            try:
+                await asyncio.sleep(wait)
+            except BaseException:
+                self.breaker.abandon(trial)
+                raise
+        return trial
+
+    async def call(self, func, *args, chat_id=None, **kwargs):
+        for attempt in range(self.max_retries + 1):
+            trial = await self.acquire(chat_id)
+            try:
+                result = await func(*args, **kwargs)
+            except Exception as e:
+                retryable = is_retryable(e)
+                # Only errors that suggest the upstream is struggling count against the breaker
+                self.breaker.record(not retryable)
+                if attempt == self.max_retries or not retryable:
+                    raise
+                self.retries += 1
+                await asyncio.sleep(self.backoff(attempt, retry_after_of(e)))
+                continue
+            except BaseException:
+                # Cancellation: CancelledError is not an Exception, so record() would never run
+                self.breaker.abandon(trial)
+                raise
+            self.breaker.record(True)
+            return result
+
+    def call_sync(self, func, *args, chat_id=None, **kwargs):
+        # Same as call, for code running on worker threads (Sheets flushes, Drive uploads)
+        for attempt in range(self.max_retries + 1):
+            trial = self.breaker.before_call(self.name)
+            wait = self._wait_for_tokens(chat_id)
+            try:
+                if wait > 0:
+                    time.sleep(wait)
+                result = func(*args, **kwargs)
+            except Exception as e:
+                retryable = is_retryable(e)
+                # Only errors that suggest the upstream is struggling count against the breaker
+                self.breaker.record(not retryable)
+                if attempt == self.max_retries or not retryable:
+                    raise
+                self.retries += 1
+                time.sleep(self.backoff(attempt, retry_after_of(e)))
+                continue
+            except BaseException:
+                self.breaker.abandon(trial)
+                raise
+            self.breaker.record(True)
+            return result
+
+
+class TelegramRetry(Exception):
+    def __init__(self, response):
+        super().__init__(f"Telegram returned {response.status_code}")
+        self.response = response
+        self.code = response.status_code
+        # Telegram puts retry_after in the JSON body as well as the header
+        try:
+            self.retry_after = response.json().get("parameters", {}).get("retry_after")
+        except ValueError:
+            self.retry_after = None
+
+
+class RateLimitedTelegram:
+    """Wraps the Telegram Bot API client so every call goes through an
+    UpstreamGuard: a global bucket, a per-chat bucket keyed by `chat_id` in
+    the payload, and retries when Telegram answers 429 or 5xx (honoring
+    `retry_after`). Other responses are returned to the caller unchanged."""
+
+    def __init__(self, client, guard):
+        self.client = client
+        self.guard = guard
+
+    async def post(self, method, json=None, **kwargs):
+        chat_id = (json or {}).get("chat_id")
+
+        async def send():
+            resp = await self.client.post(method, json=json, **kwargs)
+            if resp.status_code in RETRYABLE_STATUS:
+                raise TelegramRetry(resp)
+            return resp
+
+        with metrics.span("telegram"):
+            try:
+                return await self.guard.call(send, chat_id=chat_id)
+            except TelegramRetry as e:
+                return e.response
@@ -0,0 +1,168 @@
+import re
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+_MERSENNE_PRIME = (1 << 61) - 1
+# Words that don't change what is being asked. Negations ("not", "no", the "t" of "don't") and
+# every number are deliberately absent, so they always count as content words.
+_STOPWORDS = {
+    "a", "an", "the", "is", "are", "am", "was", "were", "be", "been", "do", "does", "did", "i", "me", "my",
+    "you", "your", "it", "its", "to", "of", "in", "on", "at", "by", "for", "with", "and", "or", "what", "which",
+    "how", "can", "could", "should", "would", "will", "please", "tell", "about", "there", "this", "that",
+    "some", "any", "s",
+}
+
+
+def normalize(text):
+    # Lowercase, drop punctuation and collapse whitespace so trivial variants share a key
+    return " ".join(re.sub(r"[^\w\s]", " ", text.lower()).split())
+
+
+def content_words(normalized):
+    # Near duplicates must ask about exactly the same things: "unsafe" never answers "safe"
+    return frozenset(normalized.split()) - _STOPWORDS
+
+
+class MinHasher:
+    """MinHash signatures over the word tokens of a normalized query."""
+
+    def __init__(self, num_perm=64, seed=1):
+        import random
+        rng = random.Random(seed)
+        self.params = [(rng.randrange(1, _MERSENNE_PRIME), rng.randrange(0, _MERSENNE_PRIME)) for _ in range(num_perm)]
+
+    def signature(self, text):
+        shingles = {zlib.crc32(word.encode()) for word in text.split()} or {0}
+        return tuple(min((a * s + b) % _MERSENNE_PRIME for s in shingles) for a, b in self.params)
+
+    @staticmethod
+    def similarity(sig_a, sig_b):
+        return sum(x == y for x, y in zip(sig_a, sig_b)) / len(sig_a)
+
+
+class ResponseCache:
+    """Cache of chat replies for repeated and near-duplicate questions.
+
+    Entries live in partitions: questions asked without history share the
+    "global" partition, while context-dependent ones are scoped to a user and
+    their history so answers are never reused across conversations. Exact
+    matches are looked up by normalized text; near duplicates through MinHash
+    LSH buckets over word tokens, served only when the estimated similarity is
+    at least `threshold` and both questions have the same content words, so
+    they can differ only in stopwords and word order ("2 bananas" never
+    answers "20 bananas", nor "is it unsafe" "is it safe").
+    """
+
+    def __init__(self, max_entries=5000, ttl=3600, threshold=0.9, bands=16):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.threshold = threshold
+        self.hasher = MinHasher(num_perm=bands * 4)
+        self.bands = bands
+        self._rows = len(self.hasher.params) // bands
+        self._entries = OrderedDict()  # (partition, normalized) -> (signature, reply, created)
+        self._buckets = {}  # (partition, band, band hash) -> set of keys
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.near_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def partition_for(user_id, history_prompt):
+        if not history_prompt:
+            return "global"
+        return f"user:{user_id}:{zlib.crc32(history_prompt.encode())}"
+
+    def _band_keys(self, partition, signature):
+        for band in range(self.bands):
+            yield (partition, band, hash(signature[band * self._rows:(band + 1) * self._rows]))
+
+    def _drop(self, key):
+        signature, _, _ = self._entries.pop(key)
+        for band_key in self._band_keys(key[0], signature):
+            bucket = self._buckets.get(band_key)
+            if bucket is not None:
+                bucket.discard(key)
+                if not bucket:
+                    del self._buckets[band_key]
+
+    def _fresh(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if time.time() - entry[2] > self.ttl:
+            self._drop(key)
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def get(self, partition, query):
+        normalized = normalize(query)
+        with self._lock:
+            entry = self._fresh((partition, normalized))
+            if entry is not None:
+                self.hits += 1
+                return entry[1]
+            signature = self.hasher.signature(normalized)
+            candidates = set()
+            for band_key in self._band_keys(partition, signature):
+                candidates.update(self._buckets.get(band_key, ()))
+            words = content_words(normalized)
+            best, best_score = None, self.threshold
+            for key in candidates:
+                if content_words(key[1]) != words:
+                    continue
+                entry = self._fresh(key)
+                if entry is None:
+                    continue
+                score = MinHasher.similarity(signature, entry[0])
+                if score >= best_score:
+                    best, best_score = entry, score
+            if best is not None:
+                self.hits += 1
+                self.near_hits += 1
+                return best[1]
+            self.misses += 1
+            return None
+
+    def put(self, partition, query, reply):
+        normalized = normalize(query)
+        key = (partition, normalized)
+        signature = self.hasher.signature(normalized)
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (signature, reply, time.time())
+            for band_key in self._band_keys(partition, signature):
+                self._buckets.setdefault(band_key, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+
+    def invalidate(self, partition=None, query=None):
+        """Drop one question, one partition, or (with no arguments) everything.
+        Returns the number of entries removed."""
+        with self._lock:
+            if query is not None:
+                keys = [(partition or "global", normalize(query))]
+            elif partition is not None:
+                keys = [key for key in self._entries if key[0] == partition]
+            else:
+                keys = list(self._entries)
+            removed = 0
+            for key in keys:
+                if key in self._entries:
+                    self._drop(key)
+                    removed += 1
+            return removed
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "near_hits": self.near_hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
@@ -0,0 +1,87 @@
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from modules import ConversationModule, ImageCalorieModule, GoogleDriveModule, text_prompt
+from metrics import metrics
+
+DEFAULT_LIMITS = {"gemini": 8, "drive": 4, "sheets": 2, "images": 4, "storage": 4}
+
+
+class AsyncServices:
+    """Async front for the blocking modules in modules.py.
+
+    Gemini goes through its native async client. Drive (and anything else without
+    an async client) runs on a bounded thread pool. Each upstream has its own
+    semaphore so a slow one cannot use up every worker, and calls go through the
+    upstream's rate_limit.UpstreamGuard when one is configured in `guards`.
+    """
+
+    def __init__(self, gemini_api_key, max_workers=8, limits=None, clients=None, guards=None):
+        self.gemini_api_key = gemini_api_key
+        self.clients = clients
+        self.guards = guards or {}
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="upstream")
+        self.limits = dict(DEFAULT_LIMITS, **(limits or {}))
+        self._semaphores = {}
+
+    def limit(self, upstream):
+        # Per-upstream semaphore, created lazily so they bind to the running event loop
+        if upstream not in self._semaphores:
+            self._semaphores[upstream] = asyncio.Semaphore(self.limits.get(upstream, 4))
+        return self._semaphores[upstream]
+
+    async def run_blocking(self, upstream, func, *args, **kwargs):
+        async with self.limit(upstream):
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.executor, functools.partial(func, *args, **kwargs))
+
+    async def call(self, upstream, func, *args, **kwargs):
+        # Await `func` under the upstream's concurrency limit and rate limiter
+        async with self.limit(upstream):
+            with metrics.span(upstream):
+                guard = self.guards.get(upstream)
+                if guard is None:
+                    return await func(*args, **kwargs)
+                return await guard.call(func, *args, **kwargs)
+
+    def _model(self, system_instruction=None):
+        return self.clients.gemini_model(system_instruction=system_instruction) if self.clients is not None else None
+
+    async def get_response(self, user_text):
+        return await self.call("gemini", ConversationModule.get_response_async, user_text, self.gemini_api_key, model=self._model(text_prompt))
+
+    async def summarize(self, summary, turns, max_words=150):
+        from context_window import estimate_tokens
+        metrics.inc("bot_prompt_tokens_total", {"prompt": "summary"},
+                    estimate_tokens(summary + "".join(user_text + reply for user_text, reply in turns)))
+        return await self.call("gemini", ConversationModule.summarize_async, summary, turns, self.gemini_api_key,
+                               model=self._model(), max_words=max_words)
+
+    async def stream_response(self, user_text):
+        async with self.limit("gemini"), metrics.span("gemini_stream"):
+            # Rate limited on start only; a stream that fails midway is not retried
+            if "gemini" in self.guards:
+                await self.guards["gemini"].acquire()
+            async for chunk in ConversationModule.stream_response_async(user_text, self.gemini_api_key, model=self._model(text_prompt)):
+                yield chunk
+
+    async def analyze_image(self, image_bytes, image_url=None, time_elapsed=None):
+        return await self.call("gemini", ImageCalorieModule.analyze_image_async, image_bytes, self.gemini_api_key,
+                               image_url=image_url, time_elapsed=time_elapsed, model=self._model())
+
+    async def analyze_images(self, images):
+        return await self.call("gemini", ImageCalorieModule.analyze_images_async, images, self.gemini_api_key, model=self._model())
+
+    async def upload_image(self, service, folder_id, file_name, image_bytes):
+        # `service` may be a zero-argument function so a cold client is built off the event loop
+        def upload():
+            drive = service() if callable(service) and not hasattr(service, "files") else service
+            guard = self.guards.get("drive")
+            with metrics.span("drive"):
+                if guard is None:
+                    return GoogleDriveModule.upload_image(drive, folder_id, file_name, image_bytes)
+                return guard.call_sync(GoogleDriveModule.upload_image, drive, folder_id, file_name, image_bytes)
+        return await self.run_blocking("drive", upload)
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False)
@@ -0,0 +1,161 @@
+import json
+import os
+import threading
+import time
+from datetime import datetime
+from modules import GoogleSheetsModule
+from metrics import metrics
+
+CHAT_HISTORY_TAB = "Chat History"
+MEAL_TRACKER_TAB = "Meal Tracker"
+
+
+class SheetLogger:
+    """Write-behind logger for the Google Sheets tabs.
+
+    Rows are written to a local append-only spool file and flushed by a
+    background thread in one append per tab once `max_batch` new rows are
+    queued or `flush_interval` seconds have passed. After a failed flush the
+    rows are kept and retried no sooner than `flush_interval` later. Flushes
+    are serialized, so an explicit `flush()` never races the background one.
+    Row IDs come from an in-memory counter per tab, seeded from the sheet on
+    the first flush. Rows left in the spool by a crash are replayed on start.
+    `service` may be a zero-argument function returning the Sheets client, in
+    which case it is only called on first flush. Sheets calls go through
+    `guard` (a rate_limit.UpstreamGuard) when given.
+    """
+
+    def __init__(self, service, spreadsheet_id, spool_path="sheet_spool.jsonl", max_batch=20, flush_interval=5.0, guard=None):
+        self.service = service
+        self.guard = guard
+        self.spreadsheet_id = spreadsheet_id
+        self.spool_path = spool_path
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self._pending = []  # list of (tab, row)
+        self._queued = 0  # rows added since the last flush; only these count toward max_batch
+        self._failed = False
+        self._next_id = {}
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()  # held for a whole flush, so row IDs are handed out once
+        self._thread = None
+        self._stopped = False
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._pending = self._read_spool()
+        self._thread = threading.Thread(target=self._run, name="sheet-logger", daemon=True)
+        self._thread.start()
+
+    def log_chat_history(self, username, user_query, bot_message):
+        now = datetime.now()
+        self._enqueue(CHAT_HISTORY_TAB, [now.strftime('%Y-%m-%d'), now.strftime('%H:%M:%S'), username, user_query, bot_message])
+
+    def log_meal_tracker(self, client, food, calories, proteins, carbs, fat, picture_url, time_elapsed, user_id=""):
+        # The Telegram user ID goes last (column M) so nutrition totals can be rebuilt per user
+        now = datetime.now()
+        self._enqueue(MEAL_TRACKER_TAB, [now.strftime('%Y-%m-%d'), now.strftime('%H:%M:%S'), client, food, calories, proteins, carbs, fat, picture_url, time_elapsed, str(user_id)])
+
+    def log_meals(self, client, entries, user_id=""):
+        # All entries go into the same flush, so an album is written in one append
+        now = datetime.now()
+        rows = [[now.strftime('%Y-%m-%d'), now.strftime('%H:%M:%S'), client, entry.food, entry.calories, entry.proteins,
+                 entry.carbs, entry.fat, entry.image_url, entry.time_elapsed, str(user_id)] for entry in entries]
+        with self._cond:
+            for row in rows:
+                self._enqueue(MEAL_TRACKER_TAB, row)
+
+    def _enqueue(self, tab, values):
+        with self._cond:
+            self._pending.append((tab, values))
+            self._queued += 1
+            with open(self.spool_path, 'a', encoding='utf-8') as spool:
+                spool.write(json.dumps({"tab": tab, "row": values}) + "\n")
+            if self._queued >= self.max_batch:
+                self._cond.notify()
+
+    def flush(self):
+        with self._flush_lock:
+            self._flush()
+
+    def _flush(self):
+        with self._cond:
+            batch = self._pending
+            self._pending = []
+            self._queued = 0
+        if not batch:
+            return
+        by_tab = {}
+        for tab, row in batch:
+            by_tab.setdefault(tab, []).append(row)
+        failed = []
+        for tab, rows in by_tab.items():
+            try:
+                service = self._service()
+                if tab not in self._next_id:
+                    self._next_id[tab] = self._call(GoogleSheetsModule.count_rows, service, self.spreadsheet_id, tab) + 1
+                first_id = self._next_id[tab]
+                numbered = [[first_id + i] + row for i, row in enumerate(rows)]
+                self._call(GoogleSheetsModule.append_rows, service, self.spreadsheet_id, tab, numbered)
+                self._next_id[tab] = first_id + len(rows)
+            except Exception as e:
+                print(f"Error flushing {len(rows)} rows to '{tab}': {e}")
+                failed.extend((tab, row) for row in rows)
+        with self._cond:
+            # Keep failed rows for the next flush and rewrite the spool to match
+            self._pending = failed + self._pending
+            self._failed = bool(failed)
+            self._rewrite_spool(self._pending)
+
+    def _call(self, func, *args):
+        with metrics.span("sheets"):
+            return self.guard.call_sync(func, *args) if self.guard is not None else func(*args)
+
+    def _service(self):
+        if callable(self.service) and not hasattr(self.service, "spreadsheets"):
+            self.service = self.service()
+        return self.service
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+    def _run(self):
+        while True:
+            deadline = time.monotonic() + self.flush_interval
+            with self._cond:
+                # After a failure only the interval triggers a retry, so a down Sheets API isn't hammered
+                while not self._stopped and (self._failed or self._queued < self.max_batch):
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                if self._stopped:
+                    return
+            self.flush()
+
+    def _read_spool(self):
+        if not os.path.exists(self.spool_path):
+            return []
+        rows = []
+        with open(self.spool_path, encoding='utf-8') as spool:
+            for line in spool:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue  # torn write from a crash
+                rows.append((record["tab"], record["row"]))
+        return rows
+
+    def _rewrite_spool(self, rows):
+        tmp_path = self.spool_path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as spool:
+            for tab, row in rows:
+                spool.write(json.dumps({"tab": tab, "row": row}) + "\n")
+        os.replace(tmp_path, self.spool_path)
@@ -0,0 +1,101 @@
+import time
+
+MAX_TELEGRAM_MSG_LENGTH = 4096
+FENCE = "```"
+
+
+def split_point(text, limit=MAX_TELEGRAM_MSG_LENGTH):
+    """Split `text` into a head of at most `limit` chars and the remainder.
+
+    Prefers a paragraph break, then a line break, then a space. If the head
+    leaves a code fence open, it is closed there and reopened in the tail so
+    both halves stay valid Markdown.
+    """
+    if len(text) <= limit:
+        return text, ""
+    window = text[:limit - len(FENCE) - 1]
+    # The cut must land past a reopened "```\n" prefix, or the tail comes back unchanged
+    min_cut = len(FENCE) + 1
+    cut = -1
+    for sep in ("\n\n", "\n", " "):
+        cut = window.rfind(sep)
+        if cut > min_cut:
+            break
+    if cut <= min_cut:
+        cut = len(window)
+    head, tail = text[:cut].rstrip(), text[cut:].lstrip()
+    if head.count(FENCE) % 2:
+        head += "\n" + FENCE
+        tail = FENCE + "\n" + tail
+    return head, tail
+
+
+def split_markdown(text, limit=MAX_TELEGRAM_MSG_LENGTH):
+    parts = []
+    while text:
+        head, text = split_point(text, limit)
+        parts.append(head)
+    return parts
+
+
+class StreamingReply:
+    """Shows a Gemini reply in Telegram while it is still being generated.
+
+    The first chunk is sent with sendMessage; later chunks update that message
+    with editMessageText at most once every `edit_interval` seconds. Once the
+    text outgrows one message it is split at a Markdown-safe boundary, the
+    finished part is finalized and the rest continues in a new message.
+    In-progress edits are plain text since partial Markdown is often unbalanced;
+    each message gets its Markdown formatting when it is finalized.
+    """
+
+    def __init__(self, telegram_client, chat_id, edit_interval=1.0, limit=MAX_TELEGRAM_MSG_LENGTH):
+        self.client = telegram_client
+        self.chat_id = chat_id
+        self.edit_interval = edit_interval
+        self.limit = limit
+        self.full_text = ""
+        self._text = ""
+        self._shown = ""
+        self._message_id = None
+        self._last_edit = 0.0
+
+    async def feed(self, chunk):
+        self.full_text += chunk
+        self._text += chunk
+        while len(self._text) > self.limit:
+            head, self._text = split_point(self._text, self.limit)
+            await self._show(head, final=True)
+            self._message_id = None
+            self._shown = ""
+        if time.monotonic() - self._last_edit >= self.edit_interval:
+            await self._show(self._text)
+
+    async def finish(self):
+        await self._show(self._text, final=True)
+        return self.full_text
+
+    async def _show(self, text, final=False):
+        if not text.strip() or (text == self._shown and not final):
+            return
+        self._last_edit = time.monotonic()
+        payload = {"chat_id": self.chat_id, "text": text}
+        if final:
+            resp = await self._send(dict(payload, parse_mode="Markdown"))
+            if resp.status_code == 200:
+                self._shown = text
+                return
+            # Fallback: plain text
+            if text == self._shown:
+                return
+        resp = await self._send(payload)
+        if resp.status_code == 200:
+            self._shown = text
+
+    async def _send(self, payload):
+        if self._message_id is None:
+            resp = await self.client.post("sendMessage", json=payload)
+            if resp.status_code == 200:
+                self._message_id = resp.json()["result"]["message_id"]
+            return resp
+        return await self.client.post("editMessageText", json=dict(payload, message_id=self._message_id))
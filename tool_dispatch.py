@@ -0,0 +1,102 @@
+import re
+import business_tools
+from modules import NO_RESPONSE, ConversationModule, text_prompt
+
+
+class ToolDispatcher:
+    """Routes offer, plan and order questions to the business_tools functions.
+
+    `local_answer` answers a message without calling Gemini only when the
+    whole message matches one of the `local` phrases registered for an
+    argument-free tool (e.g. "what are your plans"). Anything else, including
+    nutrition questions that merely mention a diet or plan, goes to Gemini via
+    `dispatch` with the conversation context and the registered function
+    declarations, so the model decides whether a tool applies. A function
+    call whose arguments don't fit its declaration is ignored in favour of
+    the model's text. Results of pure tools are memoized until `clear_memo`
+    is called.
+    """
+
+    def __init__(self, services):
+        self.services = services
+        self._tools = {}  # name -> (func, declaration, pure)
+        self._intents = {}  # classifier category -> tool name
+        self._local = []  # (compiled phrase, tool name)
+        self._memo = {}
+
+    def register(self, func, declaration, pure=False, intent=None, local=()):
+        self._tools[declaration["name"]] = (func, declaration, pure)
+        if intent:
+            self._intents[intent] = declaration["name"]
+        for phrase in local:
+            self._local.append((re.compile(phrase, re.IGNORECASE), declaration["name"]))
+
+    @property
+    def intents(self):
+        return set(self._intents)
+
+    def declarations(self):
+        return [declaration for _, declaration, _ in self._tools.values()]
+
+    def call(self, name, args=None):
+        func, _, pure = self._tools[name]
+        args = args or {}
+        if not pure:
+            return func(**args)
+        key = (name, tuple(sorted(args.items())))
+        if key not in self._memo:
+            self._memo[key] = func(**args)
+        return self._memo[key]
+
+    def clear_memo(self):
+        self._memo.clear()
+
+    def valid_args(self, name, args):
+        # Only declared parameters, and every required one present
+        parameters = self._tools[name][1].get("parameters", {})
+        return set(args) <= set(parameters.get("properties", {})) and set(parameters.get("required", ())) <= set(args)
+
+    def local_answer(self, user_text, categories):
+        names = {self._intents[intent] for intent in categories & self.intents}
+        text = " ".join(user_text.split()).rstrip("?!. ")
+        for phrase, name in self._local:
+            if name in names and phrase.fullmatch(text) and not self._tools[name][1].get("parameters", {}).get("required"):
+                return self.call(name)
+        return None
+
+    async def dispatch(self, prompt):
+        # `prompt` is the full request from ContextWindow.build, so follow-ups keep their context
+        model = self.services.clients.gemini_model(tools=self.declarations(), system_instruction=text_prompt)
+        response = await self.services.call("gemini", model.generate_content_async, ConversationModule.build_contents(prompt))
+        if not response.candidates:
+            return NO_RESPONSE
+        text = ""
+        for part in response.candidates[0].content.parts:
+            function_call = getattr(part, "function_call", None)
+            if function_call and function_call.name in self._tools:
+                args = dict(function_call.args or {})
+                if self.valid_args(function_call.name, args):
+                    return self.call(function_call.name, args)
+                print(f"Ignoring {function_call.name} call with unexpected arguments: {sorted(args)}")
+            text += getattr(part, "text", "") or ""
+        return text or NO_RESPONSE
+
+
+def business_dispatcher(services):
+    declarations = {tool["name"]: tool for tool in business_tools.tools}
+    dispatcher = ToolDispatcher(services)
+    dispatcher.register(business_tools.get_current_offers, declarations["get_current_offers"], pure=True, intent="offers", local=(
+        r"(what|which) (are|r) (your|the) (current |available )?(plans|offers)( available)?( now| right now)?",
+        r"(what|which) (plans|offers) (do you have|are available)( now| right now)?",
+        r"(do you have|are there|any) (any )?(current )?(offers|plans)( available)?( now| right now)?",
+        r"(show|list|tell) me (your|the) (current )?(plans|offers)",
+        r"(what is the )?(price|cost) (of|for) (the )?(\w+ )?plans?",
+        r"(plans|offers|pricing|price list)"
+    ))
+    dispatcher.register(business_tools.get_diet_plans, declarations["get_diet_plans"], pure=True, intent="diet", local=(
+        r"(what|which) diet plans (do you have|do you offer|are available)",
+        r"(show|list|tell) me (your|the) diet plans",
+        r"diet plans"
+    ))
+    dispatcher.register(business_tools.place_order, declarations["place_order"], intent="order")
+    return dispatcher
@@ -0,0 +1,145 @@
+import asyncio
+import json
+import sqlite3
+import time
+from collections import OrderedDict, deque
+
+
+class QueueFull(Exception):
+    pass
+
+
+class SQLiteUpdateStore:
+    """Durable copy of queued updates so a crash or redeploy doesn't lose them."""
+
+    def __init__(self, path):
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS updates ("
+            "update_id INTEGER PRIMARY KEY, chat_id INTEGER, payload TEXT, enqueued REAL)"
+        )
+        self._db.commit()
+
+    def add(self, update_id, chat_id, payload, enqueued):
+        # False when the update is already stored (a Telegram retry)
+        cursor = self._db.execute(
+            "INSERT OR IGNORE INTO updates (update_id, chat_id, payload, enqueued) VALUES (?, ?, ?, ?)",
+            (update_id, chat_id, json.dumps(payload), enqueued)
+        )
+        self._db.commit()
+        return cursor.rowcount == 1
+
+    def remove(self, update_id):
+        self._db.execute("DELETE FROM updates WHERE update_id = ?", (update_id,))
+        self._db.commit()
+
+    def pending(self):
+        rows = self._db.execute("SELECT update_id, chat_id, payload, enqueued FROM updates ORDER BY update_id").fetchall()
+        return [(update_id, chat_id, json.loads(payload), enqueued) for update_id, chat_id, payload, enqueued in rows]
+
+
+class UpdateQueue:
+    """Queue between the webhook route and the update handlers.
+
+    `submit` records an update and returns immediately; a pool of async workers
+    runs `process(payload)` for it later. Updates for the same chat are handled
+    one at a time in arrival order, different chats in parallel. Repeated
+    `update_id`s are dropped, and `submit` raises QueueFull once `max_pending`
+    updates are waiting so the webhook can push back on Telegram.
+    """
+
+    def __init__(self, process, workers=8, max_pending=1000, dedup_size=10000, store=None):
+        self.process = process
+        self.workers = workers
+        self.max_pending = max_pending
+        self.dedup_size = dedup_size
+        self.store = store
+        self._chats = {}  # chat_id -> deque of (update_id, payload, enqueued)
+        self._ready = None
+        self._tasks = []
+        self._seen = OrderedDict()
+        self._depth = 0
+        self.processed = 0
+        self.duplicates = 0
+        self.rejected = 0
+        self.failed = 0
+
+    def _start(self):
+        if self._tasks:
+            return
+        self._ready = asyncio.Queue()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        if self.store is not None:
+            for update_id, chat_id, payload, enqueued in self.store.pending():
+                self._remember(update_id)
+                self._push(update_id, chat_id, payload, enqueued)
+
+    def _remember(self, update_id):
+        self._seen[update_id] = None
+        while len(self._seen) > self.dedup_size:
+            self._seen.popitem(last=False)
+
+    def _push(self, update_id, chat_id, payload, enqueued):
+        queue = self._chats.get(chat_id)
+        if queue is None:
+            queue = self._chats[chat_id] = deque()
+            self._ready.put_nowait(chat_id)
+        queue.append((update_id, payload, enqueued))
+        self._depth += 1
+
+    def submit(self, update_id, chat_id, payload):
+        """Queue one update. Returns False for a duplicate update_id."""
+        self._start()
+        if update_id in self._seen:
+            self.duplicates += 1
+            return False
+        if self._depth >= self.max_pending:
+            self.rejected += 1
+            raise QueueFull(f"{self._depth} updates pending")
+        enqueued = time.time()
+        if self.store is not None and not self.store.add(update_id, chat_id, payload, enqueued):
+            self.duplicates += 1
+            return False
+        self._remember(update_id)
+        self._push(update_id, chat_id, payload, enqueued)
+        return True
+
+    async def _worker(self):
+        while True:
+            chat_id = await self._ready.get()
+            queue = self._chats[chat_id]
+            update_id, payload, _ = queue[0]
+            try:
+                await self.process(payload)
+                self.processed += 1
+            except Exception as e:
+                self.failed += 1
+                print(f"Error processing update {update_id}: {e}")
+            # Not reached on cancellation, so a stored update is replayed after restart
+            queue.popleft()
+            self._depth -= 1
+            if self.store is not None:
+                self.store.remove(update_id)
+            if queue:
+                self._ready.put_nowait(chat_id)
+            else:
+                del self._chats[chat_id]
+
+    def stats(self):
+        now = time.time()
+        oldest = min((queue[0][2] for queue in self._chats.values()), default=None)
+        return {
+            "depth": self._depth,
+            "chats": len(self._chats),
+            "lag_seconds": now - oldest if oldest is not None else 0.0,
+            "processed": self.processed,
+            "failed": self.failed,
+            "duplicates": self.duplicates,
+            "rejected": self.rejected,
+        }
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []